@@ -0,0 +1,166 @@
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from compositor import release_render_memory, try_reserve_memory
+from frame_pipe import RawFrameReader, background_filter, ken_burns_frame, piped_background_frames
+from render_profiler import stage_timer
+
+# A template shorter than the video is decoded ONCE, at output size and rate, into memory.
+# Looping (or ping-pong) playback is then index arithmetic over those frames: no seeking
+# back to the start, no re-decoding, and no seam from a seek that lands on the wrong frame.
+# Decoded templates are shared by every render in the process (e.g. the render daemon),
+# least recently used first out once the cache is over its byte budget.
+#
+# Cached frames are reserved from the render memory ceiling (compositor.py) like a render's
+# working set, and the caches of all processes sharing that ceiling may hold at most
+# BACKGROUND_CACHE_SHARE of it, so renders always have the rest. A template that doesn't fit
+# is streamed through the ffmpeg pipe instead. At most VIDEO_DURATION of a template is kept:
+# 288 frames of 1080x1920 RGB, ~1.7 GB, which both defaults leave room for.
+# Frames evicted while a render still plays them keep their reservation until it's done.
+BACKGROUND_CACHE_MB = int(os.getenv('BACKGROUND_CACHE_MB', '2048'))
+BACKGROUND_CACHE_SHARE = 0.6
+LOOP_MODES = ('loop', 'pingpong')
+
+_cache = OrderedDict()  # key -> read-only (frames, height, width, 3) uint8 array
+_cache_lock = threading.Lock()
+_decode_locks = {}  # key -> Lock, so concurrent renders of one template decode it once; evicted with the cache
+_users = {}  # id(frames) -> renders playing them; see release_template_frames()
+
+
+def source_index(i: int, frame_count: int, mode: str = 'loop') -> int:
+    """Which decoded template frame output frame i shows, for plain looping or ping-pong playback."""
+    if mode not in LOOP_MODES:
+        raise ValueError(f"Unknown loop mode '{mode}'. Available: {', '.join(LOOP_MODES)}")
+    if mode == 'loop' or frame_count < 2:
+        return i % frame_count
+    # Forwards then backwards, without showing the turning frames twice: 0 1 2 3 2 1 0 1 ...
+    period = 2 * frame_count - 2
+    position = i % period
+    return position if position < frame_count else period - position
+
+
+def template_frame_count(video_path: str, fps: float, duration: float) -> int:
+    """Frames the template has at the output rate, capped at what `duration` needs."""
+    source_duration = ffmpeg_parse_infos(video_path)['duration']
+    return max(1, min(int(source_duration * fps), int(round(duration * fps))))
+
+
+def decode_template(video_path: str, frame_size: tuple, fps: float, frame_count: int,
+                    scale: float = 1.0) -> np.ndarray:
+    """Decodes the first frame_count frames of a template, scaled and cropped like load_background."""
+    frames = np.empty((frame_count, frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    with RawFrameReader(video_path, frame_size, fps, frame_count / fps,
+                        background_filter(video_path, frame_size, scale), ring_size=2) as reader:
+        for i, (_, frame) in enumerate(reader.iter_frames()):
+            frames[i] = frame
+    frames.flags.writeable = False  # Shared between renders: nobody may draw on them
+    return frames
+
+
+def _evict_oldest():
+    # Called with _cache_lock held
+    key, frames = _cache.popitem(last=False)
+    _decode_locks.pop(key, None)
+    if id(frames) not in _users:  # Else the last render playing them releases the memory
+        release_render_memory(frames.nbytes)
+
+
+def _make_room(nbytes: int) -> bool:
+    """Evicts least recently used templates until nbytes fit in the cache and the shared ceiling."""
+    with _cache_lock:
+        while _cache and sum(cached.nbytes for cached in _cache.values()) + nbytes > BACKGROUND_CACHE_MB * 1024 * 1024:
+            _evict_oldest()
+        while not try_reserve_memory(nbytes, BACKGROUND_CACHE_SHARE):
+            if not _cache:
+                return False
+            _evict_oldest()
+        return True
+
+
+def cached_template_frames(video_path: str, frame_size: tuple, fps: float, frame_count: int,
+                           scale: float = 1.0):
+    """
+    Returns the decoded frames of a template, decoding them only if no render in this process
+    has yet. Returns None if there is no room for them under the memory ceiling. Pass frames
+    to release_template_frames() when done with them.
+    """
+    stat = os.stat(video_path)
+    # The file's size and mtime are part of the key, so a replaced template is decoded again
+    key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, tuple(frame_size), fps, frame_count, scale)
+    with _cache_lock:
+        decode_lock = _decode_locks.setdefault(key, threading.Lock())
+    with decode_lock:
+        with _cache_lock:
+            frames = _cache.get(key)
+            if frames is not None:
+                _cache.move_to_end(key)
+                _users[id(frames)] = _users.get(id(frames), 0) + 1
+                return frames
+        nbytes = frame_count * frame_size[0] * frame_size[1] * 3
+        if not _make_room(nbytes):
+            with _cache_lock:
+                _decode_locks.pop(key, None)
+            return None
+        try:
+            frames = decode_template(video_path, frame_size, fps, frame_count, scale)
+        except BaseException:
+            release_render_memory(nbytes)
+            raise
+        with _cache_lock:
+            _cache[key] = frames
+            _users[id(frames)] = 1
+        return frames
+
+
+def release_template_frames(frames: np.ndarray):
+    """A render is done with frames from cached_template_frames(); if they were evicted meanwhile, their memory is released."""
+    with _cache_lock:
+        _users[id(frames)] -= 1
+        if _users[id(frames)]:
+            return
+        del _users[id(frames)]
+        if not any(cached is frames for cached in _cache.values()):
+            release_render_memory(frames.nbytes)
+
+
+def clear_background_cache():
+    with _cache_lock:
+        while _cache:
+            _evict_oldest()
+
+
+def cached_background_frames(video_path: str, frame_size: tuple, fps: float, duration: float, mode: str = 'loop',
+                             profiler=None, scale: float = 1.0, first_frame: int = 0, end_frame: int = None):
+    """
+    Yields (t, frame) background frames like piped_background_frames, served from the
+    decoded-template cache. A template too big for the cache budget is streamed through the
+    ffmpeg pipe instead (plain looping only). first_frame/end_frame limit it to a range of output frames.
+    """
+    if end_frame is None:
+        end_frame = int(round(duration * fps))
+    stage = stage_timer(profiler)
+    frame_count = template_frame_count(video_path, fps, duration)
+    if frame_count * frame_size[0] * frame_size[1] * 3 > BACKGROUND_CACHE_MB * 1024 * 1024:
+        if mode != 'loop':
+            print(f"⚠️ {video_path} is too long to cache at this size, looping it instead of '{mode}'.")
+        yield from piped_background_frames(video_path, frame_size, fps, duration, profiler=profiler, scale=scale,
+                                           first_frame=first_frame, end_frame=end_frame)
+        return
+
+    with stage('decode'):
+        frames = cached_template_frames(video_path, frame_size, fps, frame_count, scale)
+    if frames is None:
+        print(f"⚠️ No room under the memory ceiling to cache {video_path}, streaming it (plain looping) instead.")
+        yield from piped_background_frames(video_path, frame_size, fps, duration, profiler=profiler, scale=scale,
+                                           first_frame=first_frame, end_frame=end_frame)
+        return
+    try:
+        for i in range(first_frame, end_frame):
+            t = i / fps
+            with stage('zoom'):
+                frame = ken_burns_frame(frames[source_index(i, len(frames), mode)], t)
+            yield t, frame
+    finally:
+        release_template_frames(frames)
@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# API handshakes (Gemini setup, Sheets authorize + open, YouTube token refresh + discovery)
+# are started together on a small thread pool the moment the process starts, while the
+# main thread verifies media and loads fonts. Startup then waits for the slowest one,
+# not all of them in a row, and a failed client is reported instead of killing the process.
+GEMINI_MODEL = 'gemini-1.5-flash'
+SHEET_NAME = 'yt_story'
+SHEETS_SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+SERVICE_ACCOUNT_FILE = 'credentials.json'
+HANDSHAKE_TIMEOUT_SECONDS = 120
+
+_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='bootstrap')
+_lock = threading.Lock()
+_handshakes = {}  # client name -> Future
+_handshake_seconds = {}
+
+
+def connect_gemini():
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+def connect_sheet():
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    creds = ServiceAccountCredentials.from_json_keyfile_name(SERVICE_ACCOUNT_FILE, SHEETS_SCOPE)
+    return gspread.authorize(creds).open(SHEET_NAME).sheet1
+
+
+def connect_youtube():
+    from upload_video import get_authenticated_service
+    return get_authenticated_service()
+
+
+CLIENT_FACTORIES = {
+    'gemini': connect_gemini,
+    'sheet': connect_sheet,
+    'youtube': connect_youtube,
+}
+
+
+def _handshake(name: str):
+    started = time.perf_counter()
+    try:
+        return CLIENT_FACTORIES[name]()
+    finally:
+        _handshake_seconds[name] = time.perf_counter() - started
+
+
+def start_clients(names=None):
+    """
+    Starts the handshakes of the given clients (default: all) in the background. Safe to call
+    twice: a running or successful handshake is kept, a failed one is started again.
+    """
+    with _lock:
+        for name in names or CLIENT_FACTORIES:
+            future = _handshakes.get(name)
+            if future is None or (future.done() and (future.cancelled() or future.exception() is not None)):
+                _handshakes[name] = _pool.submit(_handshake, name)
+
+
+def get_client(name: str, timeout: float = HANDSHAKE_TIMEOUT_SECONDS):
+    """
+    Returns a ready client, waiting for its handshake if it's still running (and starting
+    it if it never was, or failed last time). Raises the handshake's own exception if it fails.
+    """
+    start_clients([name])
+    return _handshakes[name].result(timeout=timeout)
+
+
+def report_clients(timeout: float = HANDSHAKE_TIMEOUT_SECONDS) -> dict:
+    """
+    Waits for every started handshake and prints one line per client.
+
+    Returns:
+        dict of client name -> True (ready) or the error message.
+    """
+    deadline = time.monotonic() + timeout
+    results = {}
+    for name, future in list(_handshakes.items()):
+        try:
+            future.result(timeout=max(deadline - time.monotonic(), 0))
+            results[name] = True
+            print(f"✅ {name} client ready ({_handshake_seconds.get(name, 0):.1f}s).")
+        except Exception as e:
+            results[name] = str(e) or type(e).__name__
+            print(f"⚠️ {name} client unavailable, the stages that need it will fail. Error: {results[name]}")
+    return results
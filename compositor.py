@@ -0,0 +1,209 @@
+import os
+import ctypes
+import threading
+import numpy as np
+from contextlib import contextmanager
+from render_profiler import stage_timer
+
+# Renders reserve their estimated working set from this budget before they start and
+# wait while other renders sharing the runner hold too much of it. Decoded templates cached
+# by background_source.py count against it too: the default leaves room for one cached
+# 12-second template (~1.7 GB at 1080x1920, 24 fps) next to several renders.
+MEMORY_CEILING_MB = int(os.getenv('RENDER_MEMORY_CEILING_MB', '3072'))
+
+# Process-local by default. Worker pools can swap in multiprocessing primitives with
+# share_memory_budget() so the ceiling holds across every render on the machine.
+_budget_condition = threading.Condition()
+_budget_used = ctypes.c_longlong(0)
+_budget_shared = False
+
+
+def share_memory_budget(condition, used_value):
+    """
+    Installs a cross-process memory budget (call from a worker pool initializer).
+
+    Args:
+        condition: a multiprocessing.Condition shared by all workers.
+        used_value: a multiprocessing.Value('q') holding the reserved bytes.
+    """
+    global _budget_condition, _budget_used, _budget_shared
+    _budget_condition = condition
+    _budget_used = used_value
+    _budget_shared = True
+
+
+def shared_memory_budget():
+    """The (condition, used_value) installed by share_memory_budget(), or None in a standalone process."""
+    return (_budget_condition, _budget_used) if _budget_shared else None
+
+
+@contextmanager
+def reserve_render_memory(nbytes: int, ceiling_mb: int = None):
+    """Blocks until `nbytes` fit under the memory ceiling, holds them for the duration of the block."""
+    ceiling = (ceiling_mb or MEMORY_CEILING_MB) * 1024 * 1024
+    if nbytes > ceiling:
+        raise MemoryError(f"This render needs ~{nbytes // 2**20} MB, above the {ceiling // 2**20} MB ceiling "
+                          f"(set RENDER_MEMORY_CEILING_MB to raise it).")
+    with _budget_condition:
+        if _budget_used.value + nbytes > ceiling:
+            print(f"⏳ Waiting for memory: {nbytes // 2**20} MB needed, "
+                  f"{_budget_used.value // 2**20}/{ceiling // 2**20} MB in use by other renders...")
+        _budget_condition.wait_for(lambda: _budget_used.value + nbytes <= ceiling)
+        _budget_used.value += nbytes
+    try:
+        yield
+    finally:
+        release_render_memory(nbytes)
+
+
+def try_reserve_memory(nbytes: int, share: float = 1.0, ceiling_mb: int = None) -> bool:
+    """Takes `nbytes` from the budget if they fit under `share` of the ceiling right now. Never waits."""
+    limit = (ceiling_mb or MEMORY_CEILING_MB) * 1024 * 1024 * share
+    with _budget_condition:
+        if _budget_used.value + nbytes > limit:
+            return False
+        _budget_used.value += nbytes
+        return True
+
+
+def release_render_memory(nbytes: int):
+    """Gives back bytes taken by reserve_render_memory or try_reserve_memory."""
+    with _budget_condition:
+        _budget_used.value -= nbytes
+        _budget_condition.notify_all()
+
+
+def rasterize_clip(clip) -> dict:
+    """
+    Rasterizes a static moviepy clip ONCE into a premultiplied sprite.
+
+    Returns:
+        dict with 'premultiplied' (float32 HxWx3, rgb * alpha) and 'alpha' (float32 HxW,
+        or None for fully opaque clips without a mask).
+    """
+    rgb = clip.get_frame(0).astype(np.float32)
+    if clip.mask is None:
+        return {'premultiplied': rgb, 'alpha': None}
+    alpha = clip.mask.get_frame(0).astype(np.float32)
+    return {'premultiplied': rgb * alpha[..., None], 'alpha': alpha}
+
+
+def sprite_layer(sprite: dict, position: tuple, frame_size: tuple, start: float, duration: float,
+                 fade_in: float = 0, fade_out: float = 0, opacity: float = 1.0, name: str = 'layer') -> dict:
+    """
+    Places a sprite on the frame for a time span. Everything that doesn't change per
+    frame (bounding box, opacity, 1 - alpha) is resolved here, once.
+
+    Fades work like moviepy's vfx.fadein/fadeout: the sprite's colour fades from black
+    while its coverage stays the same, so per frame they are just one scalar.
+    """
+    frame_width, frame_height = frame_size
+    height, width = sprite['premultiplied'].shape[:2]
+    x, y = position
+    if x == 'center':
+        x = (frame_width - width) / 2
+    if y == 'center':
+        y = (frame_height - height) / 2
+    x, y = int(x), int(y)
+
+    # Destination box in the frame and the matching source box in the sprite
+    y0, y1, x0, x1 = max(y, 0), min(y + height, frame_height), max(x, 0), min(x + width, frame_width)
+    sy0, sx0 = y0 - y, x0 - x
+    premultiplied = sprite['premultiplied'][sy0:sy0 + max(y1 - y0, 0), sx0:sx0 + max(x1 - x0, 0)]
+    alpha = sprite['alpha']
+    if alpha is not None:
+        alpha = alpha[sy0:sy0 + max(y1 - y0, 0), sx0:sx0 + max(x1 - x0, 0)]
+        if opacity != 1.0:
+            premultiplied, alpha = premultiplied * opacity, alpha * opacity
+        one_minus_alpha = (1.0 - alpha)[..., None]
+    else:
+        one_minus_alpha = None
+    return {
+        'name': name,
+        'start': start, 'end': start + duration, 'duration': duration,
+        'fade_in': fade_in, 'fade_out': fade_out,
+        'dst': (y0, y1, x0, x1),
+        'premultiplied': premultiplied,
+        'one_minus_alpha': one_minus_alpha,
+    }
+
+
+def fade_scale(layer: dict, t: float) -> float:
+    """The layer's colour scale at time t, matching moviepy's fadein/fadeout formulas."""
+    local_t = t - layer['start']
+    scale = 1.0
+    if layer['fade_in'] and local_t < layer['fade_in']:
+        scale *= local_t / layer['fade_in']
+    if layer['fade_out'] and layer['duration'] - local_t < layer['fade_out']:
+        scale *= (layer['duration'] - local_t) / layer['fade_out']
+    return scale
+
+
+def blend_in_place(region: np.ndarray, layer: dict, scale: float, work: np.ndarray, faded: np.ndarray):
+    """
+    Blends a premultiplied sprite over the uint8 `region` (a view into the output frame)
+    without allocating: region = scale * premultiplied + (1 - alpha) * region, truncated
+    like moviepy does. `work` and `faded` are float32 scratch views of the region's shape.
+    """
+    premultiplied = layer['premultiplied']
+    if scale != 1.0:
+        np.multiply(premultiplied, scale, out=faded)
+        premultiplied = faded
+    if layer['one_minus_alpha'] is None:
+        np.copyto(region, premultiplied, casting='unsafe')
+        return
+    np.multiply(region, layer['one_minus_alpha'], out=work)
+    work += premultiplied
+    np.copyto(region, work, casting='unsafe')
+
+
+def _scratch_shape(layers: list) -> tuple:
+    """Shape of a float32 scratch buffer big enough for the largest sprite."""
+    heights = [layer['dst'][1] - layer['dst'][0] for layer in layers] or [0]
+    widths = [layer['dst'][3] - layer['dst'][2] for layer in layers] or [0]
+    return max(heights), max(widths), 3
+
+
+def estimate_stream_bytes(layers: list, frame_size: tuple) -> int:
+    """Estimates the peak memory of one composite_stream(): its output frame and two scratch buffers."""
+    frame_width, frame_height = frame_size
+    scratch_height, scratch_width, _ = _scratch_shape(layers)
+    return frame_width * frame_height * 3 + 2 * scratch_height * scratch_width * 3 * 4
+
+
+def composite_stream(timed_background_frames, layers: list, frame_size: tuple, profiler=None):
+    """
+    Streams composited frames with bounded memory.
+
+    One output buffer and two scratch buffers are allocated up front and reused for every
+    frame; each sprite is blended only inside its own bounding box, with its fade applied
+    as a scalar. The yielded array is overwritten on the next iteration, so consumers must
+    use (or copy) it right away.
+
+    Args:
+        timed_background_frames: iterable of (t, uint8 frame) pairs. Frames are never modified.
+        layers (list): dicts from sprite_layer(), in compositing order.
+        frame_size (tuple): (width, height) of the output.
+        profiler: optional render_profiler.RenderProfiler; times the background copy and every layer.
+    """
+    stage = stage_timer(profiler)
+    frame_width, frame_height = frame_size
+    output = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+    work = np.empty(_scratch_shape(layers), dtype=np.float32)
+    faded = np.empty(_scratch_shape(layers), dtype=np.float32)
+
+    for t, background_frame in timed_background_frames:
+        with stage('composite'):
+            with stage('background copy'):
+                np.copyto(output, background_frame)
+            for layer in layers:
+                if not (layer['start'] <= t < layer['end']):
+                    continue
+                y0, y1, x0, x1 = layer['dst']
+                if y0 >= y1 or x0 >= x1:
+                    continue
+                height, width = y1 - y0, x1 - x0
+                with stage(layer['name']):
+                    blend_in_place(output[y0:y1, x0:x1], layer, fade_scale(layer, t),
+                                   work[:height, :width], faded[:height, :width])
+        yield t, output
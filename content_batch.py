@@ -0,0 +1,206 @@
+import os
+import re
+import time
+import random
+import asyncio
+from theme_scheduler import choose_theme, record_attempt
+
+# Content for a whole batch in about one Gemini round-trip instead of one per video: every
+# video's request goes out at once (each on its own theme), paced by a token bucket that
+# respects the requests-per-minute and tokens-per-minute limits and slows down when Gemini
+# answers 429. Results are deduplicated against the sheet history and against each other;
+# only the missing ones are asked for again.
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '15'))
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '1000000'))
+RESPONSE_TOKENS = 150  # A two-part insight and a title; reserved per request on top of the prompt
+MAX_RETRIES = 4  # Per request, on 429s
+BACKOFF_SECONDS = 2.0
+MAX_ROUNDS = 3  # Rounds of re-asking for the videos that came back duplicate or unparseable
+MIN_RATE_SCALE = 0.125  # 429s can slow the bucket down to an eighth of the configured rate
+
+
+def build_quote_prompt(theme: str, used_facts: list) -> str:
+    """The Gemini prompt for one two-part spiritual insight on `theme`, avoiding the used facts."""
+    history_list = "\n".join(f"- {fact}" for fact in used_facts) or "None."
+    return f"""
+    You are an AI that distills deep spiritual wisdom, based on ancient Eastern philosophy, into simple, two-part insights for a modern audience.
+    Your insight MUST be about the specific theme of: **{theme}**.
+
+    CRITICAL RULES:
+    1.  Do NOT mention specific religious texts, scriptures, gods, or historical figures. Present the ideas as universal truths.
+    2.  Your language MUST be super simple, profound, and easy to understand.
+    3.  The first part must be a "hook". The second part must be the core "reveal".
+    4.  Do NOT generate an insight similar to any in the "PREVIOUSLY USED" list.
+    5.  Your ENTIRE response MUST be in the format below, with nothing else.
+
+    **GOOD EXAMPLES OF THE REQUIRED STYLE:**
+    * EXAMPLE 1 (Theme: the true self): `PART_1: The person you see in the mirror is not the real you…\nPART_2: …it is just the temporary vessel for the eternal energy that you truly are.\nTITLE: You Are Not Your Body`
+    * EXAMPLE 2 (Theme: detachment): `PART_1: You have a right to your actions…\nPART_2: …but you have no right to the results of those actions.\nTITLE: The Secret to Inner Peace`
+
+    **PREVIOUSLY USED INSIGHTS:**
+    {history_list}
+
+    **YOUR REQUIRED OUTPUT FORMAT:**
+    PART_1:
+    [The first part of the insight]
+
+    PART_2:
+    [The second part of the insight]
+
+    TITLE:
+    [The video title]
+    """
+
+
+def parse_quote_response(text: str) -> tuple[str, str, str]:
+    """Splits a Gemini response into (part1, part2, title). Raises ValueError if it isn't in the format."""
+    if "PART_2:" not in text or "TITLE:" not in text:
+        raise ValueError("the response has no PART_2 or TITLE section")
+    part1 = text.split("PART_2:")[0].replace("PART_1:", "").strip()
+    part2 = text.split("TITLE:")[0].split("PART_2:")[1].strip()
+    title = text.split("TITLE:")[1].strip()
+    if not (part1 and part2 and title):
+        raise ValueError("the response has an empty section")
+    return part1, part2, title
+
+
+def normalize_fact(text: str) -> str:
+    """Comparison form of a fact: case, punctuation, ellipses and spacing don't make it new."""
+    return ' '.join(re.sub(r"[^\w\s]", ' ', text.lower()).split())
+
+
+class TokenBucket:
+    """
+    Requests-per-minute and tokens-per-minute limits as two token buckets (each holding up to
+    one minute's worth, so a batch can go out in one burst). A 429 pauses the bucket and
+    halves its rate; every success earns some of the rate back.
+    """
+
+    def __init__(self, requests_per_minute: float = GEMINI_RPM, tokens_per_minute: float = GEMINI_TPM):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = float(requests_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.rate_scale = 1.0
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.requests + elapsed * self.requests_per_minute * self.rate_scale / 60,
+                            self.requests_per_minute)
+        self.tokens = min(self.tokens + elapsed * self.tokens_per_minute * self.rate_scale / 60, self.tokens_per_minute)
+
+    async def acquire(self, tokens: int):
+        """Waits until one request and `tokens` tokens fit in both limits, then takes them."""
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:  # Waiters are served in order, none can starve behind smaller ones
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0:
+                    missing_requests, missing_tokens = 1 - self.requests, tokens - self.tokens
+                    if missing_requests <= 0 and missing_tokens <= 0:
+                        self.requests -= 1
+                        self.tokens -= tokens
+                        return
+                    wait = max(missing_requests * 60 / (self.requests_per_minute * self.rate_scale),
+                               missing_tokens * 60 / (self.tokens_per_minute * self.rate_scale))
+                await asyncio.sleep(wait)
+
+    def throttled(self, retry_after: float):
+        """Gemini said 429: stop sending for retry_after seconds and send slower afterwards."""
+        self.rate_scale = max(self.rate_scale / 2, MIN_RATE_SCALE)
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        self.requests = min(self.requests, 0.0)  # No burst right after a 429
+
+    def succeeded(self):
+        self.rate_scale = min(self.rate_scale * 1.1, 1.0)
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Rough Gemini token count of a request: ~4 characters per prompt token plus the reply."""
+    return len(prompt) // 4 + RESPONSE_TOKENS
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    # google.api_core's ResourceExhausted has code 429; other transports only say it in the message
+    return getattr(error, 'code', None) == 429 or type(error).__name__ == 'ResourceExhausted' or '429' in str(error)
+
+
+async def generate_content_async(model, prompt: str, limiter: TokenBucket, generation_config: dict = None,
+                                 max_retries: int = MAX_RETRIES) -> str:
+    """One rate-limited Gemini request, retried with backoff on 429s. Returns the response text."""
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(estimate_tokens(prompt))
+        try:
+            response = await model.generate_content_async(prompt, generation_config=generation_config)
+            limiter.succeeded()
+            return response.text
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == max_retries:
+                raise
+            delay = BACKOFF_SECONDS * 2 ** attempt * random.uniform(1, 1.5)  # Jitter keeps retries apart
+            print(f"  ⚠️ Gemini rate limit hit, backing off {delay:.1f}s (retry {attempt + 1}/{max_retries})...")
+            limiter.throttled(delay)
+
+
+async def generate_quote_batch_async(model, count: int, used_facts: list, theme_history: dict,
+                                     limiter: TokenBucket = None, max_rounds: int = MAX_ROUNDS,
+                                     attempts: list = None) -> list[dict]:
+    """
+    Generates up to `count` unique insights with concurrent Gemini requests, one theme each.
+
+    Args:
+        used_facts (list): part1 of every fact already published (the sheet history).
+        theme_history (dict): from theme_scheduler.load_theme_history(); every attempt is recorded in it.
+        attempts (list): every (theme, outcome) is also appended here, for theme_scheduler.save_attempts().
+
+    Returns:
+        list of {'part1', 'part2', 'title'} dicts, fewer than `count` if rounds ran out.
+    """
+    limiter = limiter or TokenBucket()
+    seen = {normalize_fact(fact) for fact in used_facts}
+    contents = []
+    for round_number in range(max_rounds):
+        missing = count - len(contents)
+        if missing <= 0:
+            break
+        themes = []
+        for _ in range(missing):
+            themes.append(choose_theme(theme_history, exclude=themes))
+        # Later rounds also steer away from what this batch already produced
+        prompt_history = list(used_facts) + [content['part1'] for content in contents]
+        print(f"🤖 Round {round_number + 1}: requesting {missing} insight(s) concurrently...")
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(generate_content_async(model, build_quote_prompt(theme, prompt_history),
+                                                                  limiter, {'temperature': 0.8})
+                                           for theme in themes), return_exceptions=True)
+        print(f"  {missing} response(s) in {time.perf_counter() - started:.1f}s")
+
+        for theme, response in zip(themes, responses):
+            try:
+                if isinstance(response, BaseException):
+                    raise response
+                part1, part2, title = parse_quote_response(response)
+            except Exception as e:
+                print(f"  ⚠️ No usable insight for '{theme}'. Error: {e}")
+                record_attempt(theme_history, theme, 'error', attempts)
+                continue
+            key = normalize_fact(part1)
+            if key in seen:
+                print(f"  ⚠️ Duplicate insight for '{theme}', dropped.")
+                record_attempt(theme_history, theme, 'duplicate', attempts)
+                continue
+            seen.add(key)
+            record_attempt(theme_history, theme, 'fact', attempts)
+            contents.append({'part1': part1, 'part2': part2, 'title': title})
+    return contents
+
+
+def generate_quote_batch(model, count: int, used_facts: list, theme_history: dict, **kwargs) -> list[dict]:
+    """Blocking wrapper around generate_quote_batch_async for the synchronous pipeline."""
+    return asyncio.run(generate_quote_batch_async(model, count, used_facts, theme_history, **kwargs))
@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import time
+import platform
+import subprocess
+from moviepy.config import get_setting
+from music_segments import AUDIO_BITRATE
+
+# Named encoder settings. 'default' is exactly what renders always used (libx264 with
+# its default rate control). A profile with 'target_size_mb' computes its bitrate from
+# the video duration, so file size (and therefore upload time) is predictable.
+ENCODE_PROFILES = {
+    'default': {'codec': 'libx264', 'preset': 'medium', 'threads': 4},
+    'quality': {'codec': 'libx264', 'preset': 'slow', 'crf': 18, 'threads': 4},
+    'fast': {'codec': 'libx264', 'preset': 'veryfast', 'crf': 23, 'threads': 4},
+    'upload': {'codec': 'libx264', 'preset': 'medium', 'target_size_mb': 12, 'threads': 4},
+    # Uses the preset picked by benchmark_presets() on this machine (falls back to 'medium')
+    'auto': {'codec': 'libx264', 'preset': 'auto', 'crf': 21, 'threads': 4},
+    # Local previews only: fastest preset, visibly lower quality
+    'draft': {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 28, 'threads': 4},
+}
+DEFAULT_PROFILE = 'default'
+
+# Fragmented MP4 for uploading while encoding: no moov atom to patch at the end, so the
+# file only ever grows and every written byte is final. A keyframe every 2 seconds starts
+# a new fragment; x264's default keyframe interval would put a short video in one fragment.
+FRAGMENTED_MP4_PARAMS = ['-force_key_frames', 'expr:gte(t,n_forced*2)',
+                         '-movflags', 'frag_keyframe+empty_moov+default_base_moof']
+
+# Keyframes at the times output_validator samples (0s always is one), so checking a finished
+# render decodes four frames instead of the whole file. Costs three extra I-frames per video.
+CHECK_KEYFRAME_TIMES = (4, 8, 10)
+
+BENCHMARK_FILE = 'encode_benchmark.json'
+BENCHMARK_PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium')
+CONTAINER_OVERHEAD = 0.02  # MP4 muxing overhead, as a fraction of the total size
+
+
+def video_bitrate_kbps(target_size_mb: float, duration: float) -> int:
+    """Computes the video bitrate that makes a file of `duration` seconds land at target_size_mb."""
+    total_kbits = target_size_mb * 8 * 1024 * (1 - CONTAINER_OVERHEAD)
+    audio_kbps = int(AUDIO_BITRATE.rstrip('k'))
+    return max(int(total_kbits / duration) - audio_kbps, 100)
+
+
+def benchmarked_preset(default: str = 'medium') -> str:
+    """Returns the preset chosen by the last benchmark on this machine, if there is one."""
+    if os.path.exists(BENCHMARK_FILE):
+        try:
+            with open(BENCHMARK_FILE, 'r', encoding='utf-8') as f:
+                benchmark = json.load(f)
+            if benchmark.get('machine') == platform.node() and benchmark.get('chosen_preset'):
+                return benchmark['chosen_preset']
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Could not read {BENCHMARK_FILE}, using the '{default}' preset. Error: {e}")
+    return default
+
+
+def writer_options(profile_name: str, duration: float, fragmented: bool = False) -> dict:
+    """
+    Translates a named profile into keyword arguments for moviepy's FFMPEG_VideoWriter.
+    With fragmented=True the output is a fragmented MP4 that can be uploaded while it's written.
+
+    Returns:
+        dict with 'codec', 'preset', 'bitrate', 'threads' and 'ffmpeg_params'.
+    """
+    if profile_name not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown encode profile '{profile_name}'. Available: {', '.join(ENCODE_PROFILES)}")
+    profile = ENCODE_PROFILES[profile_name]
+
+    preset = profile['preset']
+    if preset == 'auto':
+        preset = benchmarked_preset()
+
+    bitrate, ffmpeg_params = None, []
+    if profile.get('target_size_mb'):
+        kbps = video_bitrate_kbps(profile['target_size_mb'], duration)
+        bitrate = f"{kbps}k"
+        # Cap the peaks too, otherwise busy templates still overshoot the target
+        ffmpeg_params += ['-maxrate', f"{int(kbps * 1.5)}k", '-bufsize', f"{kbps * 2}k"]
+    elif profile.get('bitrate'):
+        bitrate = profile['bitrate']
+    elif profile.get('crf') is not None:
+        ffmpeg_params += ['-crf', str(profile['crf'])]
+    if fragmented:
+        ffmpeg_params += FRAGMENTED_MP4_PARAMS  # Its keyframe every 2 seconds covers CHECK_KEYFRAME_TIMES
+    else:
+        ffmpeg_params += ['-force_key_frames', ','.join(str(t) for t in CHECK_KEYFRAME_TIMES)]
+
+    return {'codec': profile['codec'], 'preset': preset, 'bitrate': bitrate,
+            'threads': profile.get('threads'), 'ffmpeg_params': ffmpeg_params}
+
+
+def measure_ssim(reference_path: str, encoded_path: str, video_filter: str, seconds: float) -> float:
+    """Returns ffmpeg's average SSIM of the encoded clip against the (filtered) reference."""
+    cmd = [get_setting("FFMPEG_BINARY"), '-t', str(seconds), '-i', reference_path, '-i', encoded_path,
+           '-lavfi', f"[0:v]{video_filter}[ref];[ref][1:v]ssim", '-f', 'null', '-']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    match = re.search(r"All:([0-9.]+)", result.stderr)
+    if not match:
+        raise ValueError("ffmpeg did not report an SSIM value.")
+    return float(match.group(1))
+
+
+def benchmark_presets(sample_path: str, ssim_threshold: float = 0.97, seconds: float = 4,
+                      crf: int = 21, presets: tuple = BENCHMARK_PRESETS) -> dict:
+    """
+    Encodes a few seconds of a template with each preset on THIS machine and picks the
+    fastest one whose SSIM meets the threshold. The result is saved for the 'auto' profile.
+    """
+    # Same scale and crop as a real render, so the content the encoder sees is representative
+    video_filter = "scale=-2:1920,crop=1080:1920"
+    results = []
+    for preset in presets:
+        encoded_path = f"benchmark_{preset}.mp4"
+        cmd = [get_setting("FFMPEG_BINARY"), '-y', '-v', 'error', '-t', str(seconds), '-i', sample_path,
+               '-vf', video_filter, '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+               '-pix_fmt', 'yuv420p', encoded_path]
+        started = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        encode_seconds = time.perf_counter() - started
+        try:
+            ssim = measure_ssim(sample_path, encoded_path, video_filter, seconds)
+            results.append({'preset': preset, 'encode_seconds': round(encode_seconds, 3), 'ssim': round(ssim, 5),
+                            'size_bytes': os.path.getsize(encoded_path)})
+            print(f"  {preset:>10}: {encode_seconds:6.2f}s  SSIM {ssim:.4f}  {os.path.getsize(encoded_path) // 1024} KB")
+        finally:
+            os.remove(encoded_path)
+
+    passing = [result for result in results if result['ssim'] >= ssim_threshold]
+    chosen = min(passing, key=lambda result: result['encode_seconds'])['preset'] if passing else 'medium'
+    benchmark = {'machine': platform.node(), 'cpu_count': os.cpu_count(), 'sample': sample_path,
+                 'ssim_threshold': ssim_threshold, 'crf': crf, 'results': results, 'chosen_preset': chosen}
+    with open(BENCHMARK_FILE, 'w', encoding='utf-8') as f:
+        json.dump(benchmark, f, indent=2)
+    return benchmark
+
+
+# Run this file directly to benchmark encoder presets on this machine.
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark x264 presets against an SSIM threshold")
+    parser.add_argument('sample', help="A background template to encode, e.g. spirit_temp/candles_spirit.mp4")
+    parser.add_argument('--ssim', type=float, default=0.97, help="Minimum acceptable SSIM")
+    parser.add_argument('--seconds', type=float, default=4)
+    args = parser.parse_args()
+
+    print(f"--- Benchmarking presets on {platform.node()} ({os.cpu_count()} CPUs) ---")
+    benchmark = benchmark_presets(args.sample, args.ssim, args.seconds)
+    print(f"✅ Fastest preset with SSIM >= {args.ssim}: {benchmark['chosen_preset']} (saved to {BENCHMARK_FILE})")
@@ -0,0 +1,115 @@
+import re
+import json
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A local stand-in for YouTube's resumable upload endpoint, enough to exercise
+# streaming_upload without credentials: POST opens a session, PUTs append chunks
+# (non-final ones must be multiples of 256 KiB) and get a 308 with the persisted
+# Range until the chunk carrying the total size completes the upload.
+CHUNK_GRANULARITY = 256 * 1024
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class FakeUploadHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, headers: dict = None, body: dict = None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        metadata = json.loads(self.rfile.read(length) or b'{}')
+        session_id = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.sessions[session_id] = {'metadata': metadata, 'data': bytearray(), 'video': None}
+        host, port = self.server.server_address
+        self._reply(200, {'Location': f"http://{host}:{port}/upload/{session_id}"})
+
+    def do_PUT(self):
+        session = self.server.sessions.get(self.path.rsplit('/', 1)[-1])
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        match = CONTENT_RANGE.fullmatch(self.headers.get('Content-Range', ''))
+        if session is None or match is None:
+            return self._reply(404 if session is None else 400)
+        if session['video']:
+            return self._reply(200, body=session['video'])
+
+        with self.server.lock:
+            self.server.put_count += 1
+            if self.server.fail_every and self.server.put_count % self.server.fail_every == 0:
+                return self._reply(503)  # Simulated outage; nothing of this chunk is stored
+        start, _, total = match.groups()
+        if start is not None:
+            if int(start) != len(session['data']):
+                return self._reply(400, body={'error': f"expected offset {len(session['data'])}, got {start}"})
+            if total == '*' and len(data) % CHUNK_GRANULARITY:
+                return self._reply(400, body={'error': "non-final chunks must be multiples of 256 KiB"})
+            session['data'] += data
+
+        if total != '*' and len(session['data']) == int(total):
+            session['video'] = {'id': f"fake-{uuid.uuid4().hex[:11]}", **session['metadata']}
+            return self._reply(200, body=session['video'])
+        headers = {'Range': f"bytes=0-{len(session['data']) - 1}"} if session['data'] else {}
+        self._reply(308, headers)
+
+
+def start_fake_server(port: int = 0, fail_every: int = 0) -> ThreadingHTTPServer:
+    """
+    Starts the fake endpoint on a background thread. Its upload URL is server.upload_url and
+    the received sessions are in server.sessions. With fail_every=N, every Nth PUT fails with a 503.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeUploadHandler)
+    server.sessions, server.lock, server.put_count, server.fail_every = {}, threading.Lock(), 0, fail_every
+    server.upload_url = f"http://127.0.0.1:{server.server_address[1]}/upload/youtube/v3/videos"
+    threading.Thread(target=server.serve_forever, name='fake-upload-server', daemon=True).start()
+    return server
+
+
+# Run this file directly to upload a file while it's still being written, against the fake
+# endpoint (with a failing PUT now and then), and check the server received it byte for byte.
+if __name__ == '__main__':
+    import os
+    import time
+    import tempfile
+    import requests
+    import streaming_upload
+
+    streaming_upload.RETRY_BACKOFF_SECONDS = 0.05  # Long backoffs are for real networks
+    server = start_fake_server(fail_every=3)  # Every third PUT: failures also hit the offset queries
+    path = os.path.join(tempfile.mkdtemp(), 'growing.mp4')
+    written = bytearray()
+    state = {'value': 'running'}
+
+    def write_slowly():
+        with open(path, 'wb') as f:
+            for i in range(40):
+                piece = os.urandom(37_000 + i * 1_000)  # Deliberately not aligned to 256 KiB
+                f.write(piece)
+                f.flush()
+                written.extend(piece)
+                time.sleep(0.05)
+        state['value'] = 'done'
+
+    writer = threading.Thread(target=write_slowly)
+    writer.start()
+    session = requests.Session()
+    session_uri = streaming_upload.start_session(session, {'snippet': {'title': 'test'}, 'status': {}},
+                                                 upload_url=server.upload_url)
+    video = streaming_upload.upload_growing_file(session, session_uri, path, lambda: state['value'],
+                                                 chunk_bytes=CHUNK_GRANULARITY, poll_seconds=0.05)
+    writer.join()
+    received = server.sessions[session_uri.rsplit('/', 1)[-1]]['data']
+    if received == written:
+        print(f"✅ {len(received)} bytes uploaded while being written, video {video['id']}.")
+    else:
+        exit(f"❌ The server received {len(received)} bytes that don't match the {len(written)} written.")
+    server.shutdown()
@@ -0,0 +1,36 @@
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# State files that several processes read, change and write back (the template rotation,
+# the theme history) are only touched under an exclusive lock on a <file>.lock next to them,
+# so render daemon workers running jobs in parallel don't lose each other's updates.
+
+
+@contextmanager
+def file_lock(path: str):
+    """Holds an exclusive, cross-process lock for `path` for the duration of the block."""
+    with open(path + '.lock', 'a+') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 seconds; keep waiting
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,247 @@
+import os
+import mmap
+import subprocess
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from PIL import Image
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from render_profiler import stage_timer
+
+# Raw RGB frames go to and come from ffmpeg over pipes, without the intermediate bytes
+# objects moviepy makes. Both ends count the copies they do per frame, so a render can
+# report what it actually paid.
+PIPE_BUFFER_BYTES = 1024 * 1024  # Bigger OS pipe buffers mean fewer, larger writes (Linux only)
+
+
+def _enlarge_pipe(fileobj):
+    """Asks the kernel for a bigger pipe buffer. Purely an optimization, so failures are ignored."""
+    if fcntl is None or not hasattr(fcntl, 'F_SETPIPE_SZ'):
+        return
+    try:
+        fcntl.fcntl(fileobj.fileno(), fcntl.F_SETPIPE_SZ, PIPE_BUFFER_BYTES)
+    except OSError:
+        pass
+
+
+class RawFrameWriter:
+    """
+    Drop-in replacement for moviepy's FFMPEG_VideoWriter that never copies a frame.
+
+    moviepy calls `frame.tobytes()` for every frame, which allocates and copies ~6 MB at
+    1080x1920. Here the caller's contiguous uint8 buffer (e.g. the reused output of
+    compositor.composite_stream) is handed to the pipe as a memoryview. Non-contiguous
+    frames still work, they just cost one copy, which shows up in `copies`.
+    """
+
+    def __init__(self, filename, size, fps, codec='libx264', audiofile=None, preset='medium',
+                 bitrate=None, threads=None, ffmpeg_params=None):
+        self.filename = filename
+        self.size = size
+        self.frame_bytes = size[0] * size[1] * 3
+        self.frames_written = 0
+        self.copies = 0
+
+        # Same arguments and order as FFMPEG_VideoWriter, so the encoded output is identical
+        cmd = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', '%dx%d' % (size[0], size[1]),
+               '-pix_fmt', 'rgb24', '-r', '%.02f' % fps, '-an', '-i', '-']
+        if audiofile is not None:
+            cmd += ['-i', audiofile, '-acodec', 'copy']
+        cmd += ['-vcodec', codec, '-preset', preset]
+        if ffmpeg_params:
+            cmd += ffmpeg_params
+        if bitrate is not None:
+            cmd += ['-b', bitrate]
+        if threads is not None:
+            cmd += ['-threads', str(threads)]
+        if codec == 'libx264' and size[0] % 2 == 0 and size[1] % 2 == 0:
+            cmd += ['-pix_fmt', 'yuv420p']
+        cmd.append(filename)
+
+        popen_params = {'stdin': subprocess.PIPE, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.PIPE,
+                        'bufsize': 0}  # Unbuffered: writes go straight from our buffer to the pipe
+        if os.name == 'nt':
+            popen_params['creationflags'] = 0x08000000  # CREATE_NO_WINDOW
+        self.proc = subprocess.Popen(cmd, **popen_params)
+        _enlarge_pipe(self.proc.stdin)
+
+    def write_frame(self, frame: np.ndarray):
+        """Writes one HxWx3 uint8 frame straight from its memory."""
+        if frame.dtype != np.uint8 or not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            self.copies += 1
+        if frame.nbytes != self.frame_bytes:
+            raise ValueError(f"Frame has {frame.nbytes} bytes, expected {self.frame_bytes} for size {self.size}.")
+
+        view = memoryview(frame).cast('B')
+        try:
+            # A raw pipe write may be partial, so keep going from where it stopped
+            while view:
+                written = self.proc.stdin.write(view)
+                view = view[written:]
+        except (BrokenPipeError, OSError) as e:
+            raise IOError(f"ffmpeg stopped accepting frames for {self.filename}: {self._ffmpeg_error()}") from e
+        self.frames_written += 1
+
+    def _ffmpeg_error(self) -> str:
+        self.proc.wait()
+        return self.proc.stderr.read().decode(errors='replace').strip()
+
+    def close(self):
+        if self.proc:
+            self.proc.stdin.close()
+            error = self._ffmpeg_error()
+            self.proc.stderr.close()
+            return_code = self.proc.returncode
+            self.proc = None
+            if return_code:
+                raise IOError(f"ffmpeg failed to encode {self.filename}: {error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RawFrameReader:
+    """
+    Decodes a video through an ffmpeg rawvideo pipe into a memory-mapped ring buffer.
+
+    Each frame is read with readinto() directly into its ring slot, so decoding costs no
+    copies in Python. A slot is reused `ring_size` frames later: consumers must be done
+    with a frame by then (size the ring above the number of frames in flight).
+    """
+
+    def __init__(self, filename, size, fps, duration, video_filter=None, loop=False, ring_size=8):
+        self.size = size
+        self.fps = fps
+        self.frame_count = int(round(duration * fps))
+        self.frame_bytes = size[0] * size[1] * 3
+        self.frames_read = 0
+        self.copies = 0
+
+        self.ring_buffer = mmap.mmap(-1, ring_size * self.frame_bytes)
+        self.slots = np.frombuffer(self.ring_buffer, dtype=np.uint8).reshape(ring_size, size[1], size[0], 3)
+
+        cmd = [get_setting("FFMPEG_BINARY"), '-loglevel', 'error']
+        if loop:
+            cmd += ['-stream_loop', '-1']
+        cmd += ['-i', filename, '-t', str(duration), '-an']
+        if video_filter:
+            cmd += ['-vf', video_filter]
+        cmd += ['-r', str(fps), '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE, bufsize=0)
+        _enlarge_pipe(self.proc.stdout)
+
+    def _read_into(self, slot: np.ndarray) -> bool:
+        view = memoryview(slot).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.proc.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def iter_frames(self):
+        """Yields (t, frame) pairs. Each frame is a view into the ring buffer, valid for ring_size frames."""
+        last_slot = None
+        for i in range(self.frame_count):
+            slot = self.slots[i % len(self.slots)]
+            if self._read_into(slot):
+                last_slot = slot
+            elif last_slot is not None:
+                # The source ran a frame or two short of the duration: hold the last frame
+                np.copyto(slot, last_slot)
+                self.copies += 1
+            else:
+                raise IOError(f"ffmpeg produced no frames: {self._ffmpeg_error()}")
+            self.frames_read += 1
+            yield i / self.fps, slot
+
+    def _ffmpeg_error(self) -> str:
+        self.proc.kill()
+        self.proc.wait()
+        return self.proc.stderr.read().decode(errors='replace').strip()
+
+    def close(self):
+        if self.proc:
+            self.proc.stdout.close()
+            self.proc.kill()
+            self.proc.wait()
+            self.proc.stderr.close()
+            self.proc = None
+        # The mmap can only be closed once no numpy view points at it any more
+        self.slots = None
+        try:
+            self.ring_buffer.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def background_filter(video_path: str, frame_size: tuple, scale: float = 1.0) -> str:
+    """
+    The ffmpeg equivalent of video_renderer.load_background's resize and crop: scale to the
+    frame height, then cut the frame width starting where moviepy's crop starts.
+    """
+    frame_width, frame_height = frame_size
+    source_width, source_height = ffmpeg_parse_infos(video_path)['video_size']
+    scaled_width = int(source_width * frame_height / source_height)
+    # load_background centres its crop on the *source* width (times the draft scale), so match that offset exactly
+    x_offset = max(int(source_width * scale / 2 - frame_width / 2), 0)
+    x_offset = min(x_offset, max(scaled_width - frame_width, 0))
+    return f"scale={scaled_width}:{frame_height}:flags=lanczos,crop={frame_width}:{frame_height}:{x_offset}:0"
+
+
+def ken_burns_frame(frame: np.ndarray, t: float, zoom_per_second: float = 0.02) -> np.ndarray:
+    """
+    The zoom from load_background for one frame: scale by 1 + zoom * t and keep the top-left
+    frame-sized window, which is exactly what moviepy's resize + crop combination produces.
+    """
+    height, width = frame.shape[:2]
+    scale = 1 + zoom_per_second * t
+    if scale == 1:
+        return frame
+    zoomed = Image.fromarray(frame).resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+    return np.asarray(zoomed)[:height, :width]
+
+
+def piped_background_frames(video_path: str, frame_size: tuple, fps: float, duration: float, ring_size: int = 8,
+                            profiler=None, scale: float = 1.0, first_frame: int = 0, end_frame: int = None):
+    """
+    Yields (t, frame) background frames like load_background(...).iter_frames(), decoded
+    through a RawFrameReader instead of moviepy. The zoomed frames are fresh arrays; the
+    frames before the zoom live in the reader's ring buffer. With first_frame/end_frame,
+    only that range of output frames is yielded (earlier ones are decoded, not zoomed).
+    """
+    stage = stage_timer(profiler)
+    looping = ffmpeg_parse_infos(video_path)['duration'] < duration
+    if end_frame is not None:
+        duration = end_frame / fps
+    with RawFrameReader(video_path, frame_size, fps, duration, background_filter(video_path, frame_size, scale),
+                        loop=looping, ring_size=ring_size) as reader:
+        frames = reader.iter_frames()
+        for _ in range(first_frame):
+            with stage('decode'):
+                next(frames, None)
+        while True:
+            with stage('decode'):
+                item = next(frames, None)
+            if item is None:
+                return
+            t, frame = item
+            with stage('zoom'):
+                frame = ken_burns_frame(frame, t)
+            yield t, frame
@@ -0,0 +1,166 @@
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Render jobs shared by any number of worker hosts (see render_worker.py). A worker claims a
+# job with a lease and keeps extending it with heartbeats while it renders; a job whose
+# lease ran out (the worker died or lost the volume) is claimable again, up to MAX_ATTEMPTS.
+#
+# SqliteJobStore keeps the jobs in one SQLite file on a volume every host mounts. Claims run
+# in BEGIN IMMEDIATE transactions, so two hosts can never take the same job. The default
+# rollback journal is used on purpose: WAL mode doesn't work over network filesystems.
+# Any other broker can be plugged in by implementing the same methods (submit, claim,
+# heartbeat, complete, fail, counts); MemoryJobStore is the single-process stand-in.
+DEFAULT_LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3  # Claims per job; a job that kills its worker this often is marked failed
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, lease_expires);
+"""
+
+
+def _job(row) -> dict:
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+class SqliteJobStore:
+    """A job store in a SQLite file, safe to share between processes and hosts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)  # Runs in its own transaction
+        finally:
+            self._release(db)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """One write transaction; BEGIN IMMEDIATE takes the write lock up front, so reads can't go stale."""
+        db = self._connect()
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        finally:
+            self._release(db)
+
+    def _release(self, db):
+        db.close()
+
+    def submit(self, channel: str, payload: dict) -> int:
+        """Queues a job and returns its ID."""
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute("INSERT INTO jobs (channel, payload, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                                (channel, json.dumps(payload, ensure_ascii=False), now, now))
+            return cursor.lastrowid
+
+    def claim(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """
+        Leases the oldest claimable job to `worker`: a queued one, or a running one whose lease
+        expired. Returns the job dict, or None if there is nothing to do.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            # Jobs that outlived their last allowed attempt are given up on, not retried forever
+            db.execute("UPDATE jobs SET status = 'failed', error = 'lease expired on the last attempt', "
+                       "updated_at = ? WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                       (now, now, MAX_ATTEMPTS))
+            row = db.execute("SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                             "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            if row['status'] == 'running':
+                print(f"♻️ Reclaiming job {row['id']}: the lease of {row['worker']} expired.")
+            db.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                       "updated_at = ? WHERE id = ?", (worker, now + lease_seconds, now, row['id']))
+            return _job(db.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extends the lease. False means the worker no longer holds it (it expired and was reclaimed)."""
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                                "WHERE id = ? AND worker = ? AND status = 'running'",
+                                (now + lease_seconds, now, job_id, worker))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result: dict) -> bool:
+        """Records a finished job. False if the lease was lost to another worker in the meantime."""
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ? "
+                                "WHERE id = ? AND worker = ? AND status = 'running'",
+                                (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str, retry: bool = True) -> bool:
+        """Gives a job back after an error: queued again while it has attempts left, else failed."""
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET status = CASE WHEN ? AND attempts < ? THEN 'queued' ELSE 'failed' END, "
+                                "worker = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                                "WHERE id = ? AND worker = ? AND status = 'running'",
+                                (retry, MAX_ATTEMPTS, error, time.time(), job_id, worker))
+            return cursor.rowcount == 1
+
+    def get(self, job_id: int):
+        with self._transaction() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return _job(row) if row else None
+
+    def counts(self) -> dict:
+        """Jobs per status, with running jobs whose lease expired counted as 'stale'."""
+        with self._transaction() as db:
+            rows = db.execute("SELECT CASE WHEN status = 'running' AND lease_expires < ? THEN 'stale' ELSE status END "
+                              "AS state, COUNT(*) AS jobs FROM jobs GROUP BY state", (time.time(),)).fetchall()
+            return {row['state']: row['jobs'] for row in rows}
+
+
+class MemoryJobStore(SqliteJobStore):
+    """The same store in memory, for a single process (tests, local runs). Threads may share it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        super().__init__(':memory:')
+
+    def _connect(self):
+        self._lock.acquire()
+        return self._db
+
+    def _release(self, db):
+        self._lock.release()
+
+
+def open_job_store(location: str):
+    """'memory' for the in-process stand-in, otherwise the path of a (shared) SQLite file."""
+    return MemoryJobStore() if location == 'memory' else SqliteJobStore(location)
@@ -0,0 +1,165 @@
+import os
+import json
+import subprocess
+import numpy as np
+from moviepy.config import get_setting
+
+# The media index is built ahead of the render (the workflow runs this file and
+# template_index.py right after downloading the media, and commits the result back),
+# so a render only has to look up the precomputed values.
+MEDIA_INDEX_FILE = 'media_index.json'
+
+ANALYSIS_SAMPLE_RATE = 22050   # Plenty for energy/onset curves, and fast to decode
+HOP_SECONDS = 0.05             # Resolution of the energy and onset curves
+ONSET_WEIGHT = 0.5             # How much "rhythmic activity" counts next to loudness
+TARGET_RMS_DBFS = -18.0        # Loudness every music window is normalized to
+MAX_GAIN_DB = 12.0             # Never boost or cut a track by more than this
+
+
+def load_media_index(index_path: str = MEDIA_INDEX_FILE) -> dict:
+    """Loads the media index, returning an empty index if it's missing or corrupt."""
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Could not read media index '{index_path}', starting a new one. Error: {e}")
+    return {}
+
+
+def save_media_index(index: dict, index_path: str = MEDIA_INDEX_FILE):
+    """Writes the media index atomically so a crash never leaves half a file behind."""
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(temp_path, index_path)
+
+
+def decode_pcm(path: str, sample_rate: int = ANALYSIS_SAMPLE_RATE) -> np.ndarray:
+    """Decodes an audio file to mono float32 PCM in [-1, 1] using ffmpeg."""
+    cmd = [get_setting("FFMPEG_BINARY"), '-v', 'error', '-i', path,
+           '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(sample_rate), '-']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def energy_and_onset_curves(samples: np.ndarray, sample_rate: int = ANALYSIS_SAMPLE_RATE):
+    """
+    Computes per-hop RMS energy and a spectral-flux onset curve.
+
+    Returns:
+        (rms, onset): two float arrays with one value per HOP_SECONDS of audio.
+    """
+    hop = int(sample_rate * HOP_SECONDS)
+    n_frames = len(samples) // hop
+    if n_frames < 2:
+        return np.zeros(n_frames, dtype=np.float32), np.zeros(n_frames, dtype=np.float32)
+
+    frames = samples[:n_frames * hop].reshape(n_frames, hop)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+
+    # Spectral flux: how much new energy appears in each frequency bin from one hop to the next.
+    magnitudes = np.abs(np.fft.rfft(frames * np.hanning(hop), axis=1))
+    flux = np.maximum(np.diff(magnitudes, axis=0), 0).sum(axis=1)
+    onset = np.concatenate(([0.0], flux))
+    return rms, onset
+
+
+def best_window_start(rms: np.ndarray, onset: np.ndarray, window_seconds: float) -> tuple[float, float]:
+    """
+    Finds the start (in seconds) of the window with the highest combined energy/onset score.
+
+    Returns:
+        (start_seconds, score)
+    """
+    window_frames = int(round(window_seconds / HOP_SECONDS))
+    if len(rms) <= window_frames:
+        return 0.0, 0.0
+
+    # Normalize both curves to [0, 1] so neither dominates just because of its units.
+    rms_norm = rms / (rms.max() or 1.0)
+    onset_norm = onset / (onset.max() or 1.0)
+    curve = rms_norm + ONSET_WEIGHT * onset_norm
+
+    # Sliding-window mean for every possible start in one vectorized pass.
+    cumulative = np.concatenate(([0.0], np.cumsum(curve)))
+    window_scores = (cumulative[window_frames:] - cumulative[:-window_frames]) / window_frames
+    best = int(np.argmax(window_scores))
+    return best * HOP_SECONDS, float(window_scores[best])
+
+
+def normalization_gain_db(samples: np.ndarray) -> float:
+    """Returns the gain (dB) that brings the given samples to TARGET_RMS_DBFS, clamped to MAX_GAIN_DB."""
+    rms = float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
+    if rms <= 1e-6:
+        return 0.0
+    gain = TARGET_RMS_DBFS - 20 * np.log10(rms)
+    return float(np.clip(gain, -MAX_GAIN_DB, MAX_GAIN_DB))
+
+
+def analyze_music_track(path: str, window_seconds: float) -> dict:
+    """Analyses one track and returns its index entry (best window and normalization gain)."""
+    samples = decode_pcm(path)
+    rms, onset = energy_and_onset_curves(samples)
+    start, score = best_window_start(rms, onset, window_seconds)
+
+    first = int(start * ANALYSIS_SAMPLE_RATE)
+    last = first + int(window_seconds * ANALYSIS_SAMPLE_RATE)
+    return {
+        'size': os.path.getsize(path),
+        'window': window_seconds,
+        'start': round(start, 3),
+        'score': round(score, 4),
+        'gain_db': round(normalization_gain_db(samples[first:last]), 2),
+        'duration': round(len(samples) / ANALYSIS_SAMPLE_RATE, 3),
+    }
+
+
+def build_music_index(music_folder: str = 'spirit_music', window_seconds: float = 12,
+                      index_path: str = MEDIA_INDEX_FILE, force: bool = False) -> dict:
+    """Offline pass: analyses every .mp3 in the folder and caches its best window in the media index."""
+    index = load_media_index(index_path)
+    music_index = index.setdefault('music', {})
+
+    for filename in sorted(f for f in os.listdir(music_folder) if f.endswith('.mp3')):
+        path = os.path.join(music_folder, filename)
+        key = path.replace(os.sep, '/')
+        entry = music_index.get(key)
+        if not force and entry and entry.get('size') == os.path.getsize(path) and entry.get('window') == window_seconds:
+            print(f"  ⏭️ {key} already indexed (start {entry['start']}s).")
+            continue
+        try:
+            music_index[key] = analyze_music_track(path, window_seconds)
+            print(f"  ✅ {key}: best window starts at {music_index[key]['start']}s, gain {music_index[key]['gain_db']} dB")
+        except Exception as e:
+            print(f"  ⚠️ Could not analyse {key}, skipping. Error: {e}")
+
+    save_media_index(index, index_path)
+    return index
+
+
+def lookup_music_window(music_path: str, window_seconds: float,
+                        index_path: str = MEDIA_INDEX_FILE) -> tuple[float, float]:
+    """
+    Looks up the precomputed best window for a track. No analysis happens here.
+
+    Returns:
+        (start_seconds, gain_db). Falls back to (0.0, 0.0) if the track isn't indexed
+        or the file changed since it was analysed.
+    """
+    entry = load_media_index(index_path).get('music', {}).get(music_path.replace(os.sep, '/'))
+    if not entry or entry.get('window') != window_seconds:
+        print(f"⚠️ No music window indexed for '{music_path}', using the start of the track.")
+        return 0.0, 0.0
+    if os.path.exists(music_path) and os.path.getsize(music_path) != entry.get('size'):
+        print(f"⚠️ '{music_path}' changed since it was indexed, using the start of the track.")
+        return 0.0, 0.0
+    return float(entry['start']), float(entry.get('gain_db', 0.0))
+
+
+# Run this file directly to (re)build the music section of the media index.
+if __name__ == '__main__':
+    import sys
+    print("--- Building music index ---")
+    build_music_index(force='--force' in sys.argv)
+    print(f"✅ Media index written to {MEDIA_INDEX_FILE}")
@@ -0,0 +1,72 @@
+import os
+import hashlib
+import subprocess
+from moviepy.config import get_setting
+from media_index import lookup_music_window
+
+# Finished, ready-to-mux AAC streams live here, one per (track, window, gain, duration).
+SEGMENT_CACHE_FOLDER = 'music_segments'
+FADE_IN_SECONDS = 0.5
+FADE_OUT_SECONDS = 1.0
+AUDIO_BITRATE = '192k'
+AUDIO_SAMPLE_RATE = 44100
+
+
+def segment_path(music_path: str, start: float, duration: float, gain_db: float,
+                 cache_folder: str = SEGMENT_CACHE_FOLDER) -> str:
+    """Returns the cache path for a segment. Everything that changes the audio is part of the name."""
+    key = f"{music_path.replace(os.sep, '/')}|{os.path.getsize(music_path)}|{start}|{duration}|{gain_db}" \
+          f"|{FADE_IN_SECONDS}|{FADE_OUT_SECONDS}|{AUDIO_BITRATE}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(music_path))[0].replace(' ', '_')
+    return os.path.join(cache_folder, f"{name}_{digest}.m4a")
+
+
+def build_music_segment(music_path: str, start: float, duration: float, gain_db: float, output_path: str):
+    """Trims, normalizes and fades a track with ffmpeg and encodes it to AAC exactly once."""
+    fade_out_start = max(duration - FADE_OUT_SECONDS, 0)
+    audio_filter = (f"volume={gain_db}dB,"
+                    f"afade=t=in:st=0:d={FADE_IN_SECONDS},"
+                    f"afade=t=out:st={fade_out_start}:d={FADE_OUT_SECONDS}")
+    # Write to a temp file first so an interrupted encode never poisons the cache.
+    temp_path = output_path + '.part.m4a'
+    cmd = [get_setting("FFMPEG_BINARY"), '-y', '-v', 'error',
+           '-ss', str(start), '-t', str(duration), '-i', music_path,
+           '-vn', '-af', audio_filter, '-ac', '2', '-ar', str(AUDIO_SAMPLE_RATE),
+           '-c:a', 'aac', '-b:a', AUDIO_BITRATE, temp_path]
+    subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    os.replace(temp_path, output_path)
+
+
+def get_music_segment(music_path: str, duration: float, cache_folder: str = SEGMENT_CACHE_FOLDER) -> str:
+    """
+    Returns the path of a pre-encoded AAC segment for the track's best window,
+    encoding it only if it isn't cached yet.
+    """
+    start, gain_db = lookup_music_window(music_path, duration)
+    path = segment_path(music_path, start, duration, gain_db, cache_folder)
+    if os.path.exists(path):
+        print(f"🎵 Using cached music segment: {path}")
+        return path
+
+    os.makedirs(cache_folder, exist_ok=True)
+    print(f"🎵 Encoding music segment {start}s-{start + duration}s ({gain_db:+.1f} dB) to {path}...")
+    build_music_segment(music_path, start, duration, gain_db, path)
+    return path
+
+
+def build_segment_cache(music_folder: str = 'spirit_music', duration: float = 12,
+                        cache_folder: str = SEGMENT_CACHE_FOLDER):
+    """Offline pass: pre-encodes the segment of every track so renders never touch the MP3s."""
+    for filename in sorted(f for f in os.listdir(music_folder) if f.endswith('.mp3')):
+        try:
+            get_music_segment(os.path.join(music_folder, filename), duration, cache_folder)
+        except Exception as e:
+            print(f"  ⚠️ Could not encode a segment for {filename}, skipping. Error: {e}")
+
+
+# Run this file directly to pre-encode every music segment.
+if __name__ == '__main__':
+    print("--- Building music segment cache ---")
+    build_segment_cache()
+    print(f"✅ Music segments are ready in {SEGMENT_CACHE_FOLDER}/")
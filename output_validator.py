@@ -0,0 +1,178 @@
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from encode_profiles import CHECK_KEYFRAME_TIMES
+from template_index import CAPTION_REGIONS, HEADING_REGION
+from video_renderer import FPS, FRAME_HEIGHT, FRAME_WIDTH, VIDEO_DURATION
+
+# A render is checked before it is uploaded, because a broken upload costs the daily quota and
+# has to be deleted by hand. The check never decodes the whole video: the container header
+# gives duration, size, rate and audio, and four frames are decoded at known times (renders
+# have keyframes there, see CHECK_KEYFRAME_TIMES) at a quarter of the size, all in parallel.
+# The frames are then checked with a few vectorized numpy passes. Takes ~0.4s.
+#
+# Captions are white with a black stroke: that white-next-to-black edge is what the caption
+# check looks for. part1 is fully visible at 4s and part2 at 8s and 10s.
+#
+# A black or frozen background only gets a warning: the thresholds aren't calibrated against
+# every template, and a dark or near-still one (candles, a night sky) must not block an upload.
+# Broken metadata, undecodable frames and missing captions or heading block it.
+SAMPLE_TIMES = (0,) + CHECK_KEYFRAME_TIMES
+CAPTION_TIMES = {4: 'part1', 8: 'part2', 10: 'part2'}
+CHECK_WIDTH, CHECK_HEIGHT = FRAME_WIDTH // 4, FRAME_HEIGHT // 4
+
+DURATION_TOLERANCE = 0.25  # Seconds; the AAC track may end a frame or two after the video
+# Bands that only ever show the background: above the heading and below the lowest caption
+BACKGROUND_BANDS = ((0.0, 0.18), (0.80, 1.0))
+BLACK_LUMA = 16 / 255  # A frame whose background is this dark even at its 95th percentile is black
+FROZEN_DIFFERENCE = 0.002  # Mean luma change below this between samples seconds apart: nothing moves
+WHITE = 0.8  # Every channel at least this bright: caption fill, not a yellow or cyan background
+EDGE_STRENGTH = 0.4  # Luma step between neighbouring pixels that counts as a stroke edge
+MIN_CAPTION_EDGES = 0.005  # Share of a caption region's pixels that must be white stroke edges
+HEADING_MIN_BRIGHT = 0.6  # The white heading box...
+HEADING_MIN_DARK = 0.02  # ...with its black text in it
+
+_results = {}  # (path, size, mtime) -> problems, so a render checked once isn't decoded again
+
+
+def check_metadata(path: str) -> tuple[list[str], dict]:
+    """Checks the container metadata without decoding anything. Returns (problems, infos)."""
+    try:
+        infos = ffmpeg_parse_infos(path)
+    except (IOError, OSError) as e:  # moviepy raises IOError for a file ffmpeg can't parse (truncated, no moov)
+        return [f"the file can't be read ({str(e).splitlines()[0]})"], {}
+    problems = []
+    duration = infos.get('duration') or 0
+    if abs(duration - VIDEO_DURATION) > DURATION_TOLERANCE:
+        problems.append(f"it is {duration:.2f}s long instead of {VIDEO_DURATION}s")
+    if tuple(infos.get('video_size') or ()) != (FRAME_WIDTH, FRAME_HEIGHT):
+        problems.append(f"its frames are {infos.get('video_size')} instead of {FRAME_WIDTH}x{FRAME_HEIGHT}")
+    if abs((infos.get('video_fps') or 0) - FPS) > 0.01:
+        problems.append(f"it runs at {infos.get('video_fps')} fps instead of {FPS}")
+    if not infos.get('audio_found'):
+        problems.append("it has no audio track")
+    return problems, infos
+
+
+def sample_frames(path: str, times: tuple = SAMPLE_TIMES) -> np.ndarray:
+    """
+    Decodes one small frame at each of `times`, one ffmpeg process per frame, all at once.
+    Seeking before the input jumps straight to the keyframe there, so each decodes a single frame.
+
+    Returns:
+        (len(times), CHECK_HEIGHT, CHECK_WIDTH, 3) uint8 array.
+    """
+    frame_bytes = CHECK_WIDTH * CHECK_HEIGHT * 3
+    processes = [subprocess.Popen([get_setting("FFMPEG_BINARY"), '-v', 'error', '-ss', str(t), '-i', path,
+                                   '-frames:v', '1', '-vf', f'scale={CHECK_WIDTH}:{CHECK_HEIGHT}',
+                                   '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'],
+                                  stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                 for t in times]
+    frames = np.empty((len(times), CHECK_HEIGHT, CHECK_WIDTH, 3), dtype=np.uint8)
+    for i, (t, process) in enumerate(zip(times, processes)):
+        data, error = process.communicate()
+        if len(data) < frame_bytes:
+            raise ValueError(f"no frame could be decoded at {t}s ({error.decode(errors='replace').strip()})")
+        frames[i] = np.frombuffer(data[:frame_bytes], dtype=np.uint8).reshape(CHECK_HEIGHT, CHECK_WIDTH, 3)
+    return frames
+
+
+def _rows(region: tuple, height: int = CHECK_HEIGHT) -> slice:
+    return slice(int(region[0] * height), int(region[1] * height))
+
+
+def _cols(region: tuple, width: int = CHECK_WIDTH) -> slice:
+    return slice(int(region[2] * width), int(region[3] * width))
+
+
+def caption_edges(frames: np.ndarray, luma: np.ndarray) -> np.ndarray:
+    """Per-pixel mask of white pixels with a sharp luma step to a horizontal neighbour (text against its stroke)."""
+    steps = np.abs(np.diff(luma, axis=2)) > EDGE_STRENGTH
+    edges = np.zeros(luma.shape, dtype=bool)
+    edges[:, :, 1:] |= steps
+    edges[:, :, :-1] |= steps
+    return edges & (frames.min(axis=3) > WHITE * 255)
+
+
+def check_frames(frames: np.ndarray, times: tuple = SAMPLE_TIMES) -> tuple[list[str], list[str]]:
+    """
+    Looks for black frames, a frozen picture, missing captions and a missing heading.
+
+    Returns:
+        (problems, warnings): missing captions or heading, and a black or frozen background.
+    """
+    luma = frames.astype(np.float32) @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32) / 255.0
+    background = np.concatenate([luma[:, _rows((top, bottom))] for top, bottom in BACKGROUND_BANDS], axis=1)
+    problems, warnings = [], []
+
+    brightest = np.percentile(background.reshape(len(times), -1), 95, axis=1)
+    black = [f"{t}s" for t, value in zip(times, brightest) if value < BLACK_LUMA]
+    if black:
+        warnings.append(f"the background is black at {', '.join(black)}")
+
+    changes = np.abs(np.diff(background, axis=0)).mean(axis=(1, 2))
+    frozen = [f"{a}s-{b}s" for a, b, change in zip(times, times[1:], changes) if change < FROZEN_DIFFERENCE]
+    if frozen and not black:
+        warnings.append(f"the picture doesn't change between {', '.join(frozen)}")
+
+    # The caption can sit in any of the candidate regions, depending on the template
+    edges = caption_edges(frames, luma)
+    density = np.max([edges[:, _rows(region), _cols(region)].mean(axis=(1, 2)) for region in CAPTION_REGIONS.values()],
+                     axis=0)
+    for t, value in zip(times, density):
+        if t in CAPTION_TIMES and value < MIN_CAPTION_EDGES:
+            problems.append(f"no {CAPTION_TIMES[t]} caption at {t}s")
+
+    heading = luma[:, _rows(HEADING_REGION), _cols(HEADING_REGION)]
+    bright = (heading > 0.9).mean(axis=(1, 2))
+    dark = (heading < 0.3).mean(axis=(1, 2))
+    missing = [f"{t}s" for t, b, d in zip(times, bright, dark) if b < HEADING_MIN_BRIGHT or d < HEADING_MIN_DARK]
+    if missing:
+        problems.append(f"no heading at {', '.join(missing)}")
+    return problems, warnings
+
+
+def validate_video(path: str) -> list[str]:
+    """
+    Fast pre-upload check of a finished render. A file that was already checked in this
+    process (same size and modification time) isn't decoded again.
+
+    Returns:
+        list of problems (human-readable); empty if the video is fine to upload.
+    """
+    stat = os.stat(path) if os.path.exists(path) else None
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns) if stat else None
+    if key in _results:
+        return list(_results[key])
+    started = time.perf_counter()
+    problems, infos = check_metadata(path)
+    warnings = []
+    if infos and (infos.get('duration') or 0) >= max(SAMPLE_TIMES):
+        try:
+            frame_problems, warnings = check_frames(sample_frames(path))
+            problems += frame_problems
+        except ValueError as e:
+            problems.append(str(e))
+    elapsed = time.perf_counter() - started
+    if key:
+        _results[key] = list(problems)
+    for warning in warnings:
+        print(f"⚠️ {path}: {warning}. Uploading it anyway; have a look if the template isn't meant to be dark or still.")
+    if problems:
+        print(f"❌ {path} failed validation ({elapsed:.2f}s): {'; '.join(problems)}")
+    else:
+        print(f"✅ {path} passed validation ({elapsed:.2f}s)")
+    return problems
+
+
+# Run this file directly to check videos before uploading them by hand
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python output_validator.py VIDEO [VIDEO ...]")
+        sys.exit(2)
+    failed = [path for path in sys.argv[1:] if validate_video(path)]
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,93 @@
+import os
+import json
+import shutil
+import hashlib
+from run_checkpoints import file_sha256
+
+# Finished renders, stored under a hash of EVERYTHING that went into them (script, template
+# and music contents, font, layout and encoder settings). The same inputs always make the
+# same video, so a re-run after a failure, or the same script for another channel, gets the
+# stored mp4 back instead of rendering it again. The folder is kept under a size budget by
+# evicting the least recently used renders; a hit counts as a use.
+RENDER_CACHE_FOLDER = os.getenv('RENDER_CACHE_DIR', 'render_cache')
+RENDER_CACHE_MB = int(os.getenv('RENDER_CACHE_MB', '2048'))
+RENDER_CACHE_ENABLED = os.getenv('RENDER_CACHE', '1') == '1'
+# Part of every key: bump it when a code change alters rendered pixels, so old entries miss
+RENDER_CACHE_VERSION = 1
+
+_content_hashes = {}  # (path, size, mtime) -> sha256, so a template is hashed once per process
+
+
+def content_hash(path: str) -> str:
+    """sha256 of a file's contents, remembered for as long as the file doesn't change."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _content_hashes:
+        _content_hashes[memo_key] = file_sha256(path)
+    return _content_hashes[memo_key]
+
+
+def render_key(inputs: dict) -> str:
+    """The cache key of a render: a hash of its inputs as canonical JSON."""
+    canonical = json.dumps({'version': RENDER_CACHE_VERSION, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def cached_render_path(key: str, cache_folder: str = RENDER_CACHE_FOLDER) -> str:
+    return os.path.join(cache_folder, f"{key}.mp4")
+
+
+def lookup_render(key: str, cache_folder: str = RENDER_CACHE_FOLDER):
+    """Returns the cached mp4 for a key (marking it as recently used), or None."""
+    path = cached_render_path(key, cache_folder)
+    if not os.path.exists(path):
+        return None
+    os.utime(path)  # Eviction goes by mtime; atime isn't reliable on noatime mounts
+    return path
+
+
+def store_render(key: str, video_path: str, cache_folder: str = RENDER_CACHE_FOLDER,
+                 max_mb: int = RENDER_CACHE_MB) -> str:
+    """Copies a finished render into the cache and evicts old entries to stay under max_mb."""
+    os.makedirs(cache_folder, exist_ok=True)
+    path = cached_render_path(key, cache_folder)
+    # Copy under a temp name first so a concurrent lookup never finds a half-written mp4
+    temp_path = f"{path}.{os.getpid()}.part"
+    shutil.copyfile(video_path, temp_path)
+    os.replace(temp_path, path)
+    evict_renders(cache_folder, max_mb, keep=path)
+    return path
+
+
+def evict_renders(cache_folder: str = RENDER_CACHE_FOLDER, max_mb: int = RENDER_CACHE_MB, keep: str = None) -> int:
+    """Deletes least recently used renders until the cache fits in max_mb. Returns how many were deleted."""
+    entries = []
+    for name in os.listdir(cache_folder):
+        if name.endswith('.mp4'):
+            path = os.path.join(cache_folder, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    total, evicted = sum(size for _, size, _ in entries), 0
+    for _, size, path in entries:
+        if total <= max_mb * 1024 * 1024:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            evicted += 1
+        except FileNotFoundError:  # Another process evicted it first
+            total -= size
+    return evicted
+
+
+# Run this file directly to see what the render cache holds.
+if __name__ == '__main__':
+    if not os.path.isdir(RENDER_CACHE_FOLDER):
+        exit(f"No render cache at {RENDER_CACHE_FOLDER} yet.")
+    sizes = [os.path.getsize(os.path.join(RENDER_CACHE_FOLDER, name))
+             for name in os.listdir(RENDER_CACHE_FOLDER) if name.endswith('.mp4')]
+    print(f"{len(sizes)} cached renders, {sum(sizes) / 1024 / 1024:.1f} of {RENDER_CACHE_MB} MB "
+          f"in {RENDER_CACHE_FOLDER}")
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import argparse
+import importlib
+import traceback
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from compositor import share_memory_budget
+from bootstrap import report_clients
+
+# Jobs are JSON files dropped into spool/incoming. A job moves to processing/ while it runs
+# and ends up in done/ or failed/ together with the results of every video it produced.
+SPOOL_FOLDER = 'spool'
+POLL_SECONDS = 2
+
+# Channels the daemon can render, mapped to the script module that implements their pipeline.
+CHANNEL_MODULES = {
+    'spirit': 'spirit_git',
+}
+PRIVACY_STATUSES = ('public', 'private', 'unlisted')
+# A video whose worker process dies (OOM kill, segfault in a codec) is retried this many times
+# in a fresh pool; its checkpoints make the retry pick up where it stopped. Videos that were only
+# queued when the pool broke are resubmitted without counting against them.
+WORKER_CRASH_RETRIES = 1
+
+# Set once per worker process by _warm_worker and reused for every job it runs.
+_channel_module = None
+
+
+def spool_path(state: str, name: str = '') -> str:
+    folder = os.path.join(SPOOL_FOLDER, state)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+
+def submit_job(channel: str = 'spirit', count: int = 1, privacy: str = 'public', upload: bool = True) -> str:
+    """Drops a job into the spool for a running daemon to pick up. Returns the job file path."""
+    if channel not in CHANNEL_MODULES:
+        raise ValueError(f"Unknown channel '{channel}'. Available: {', '.join(CHANNEL_MODULES)}")
+    if privacy not in PRIVACY_STATUSES:
+        raise ValueError(f"Privacy must be one of {PRIVACY_STATUSES}, got '{privacy}'")
+
+    job_id = f"{channel}-{int(time.time() * 1000)}"
+    job = {'channel': channel, 'count': count, 'privacy': privacy, 'upload': upload}
+    # Write under a temp name first so the daemon never reads a half-written job
+    temp_path = spool_path('incoming', f".{job_id}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, indent=2)
+    final_path = spool_path('incoming', f"{job_id}.json")
+    os.replace(temp_path, final_path)
+    return final_path
+
+
+def _warm_worker(channel: str, budget_condition, budget_used):
+    """Runs once per worker process: pays for imports, auth, discovery and font loading up front."""
+    global _channel_module
+    # All workers draw from one render memory ceiling instead of one each
+    share_memory_budget(budget_condition, budget_used)
+    _channel_module = importlib.import_module(CHANNEL_MODULES[channel])  # Starts the API handshakes
+    _channel_module.setup_environment()
+    report_clients()
+
+    from text_layout import glyph_metrics
+    glyph_metrics(_channel_module.FONT_PATH)
+    try:
+        _channel_module.get_youtube_service()
+    except Exception as e:
+        print(f"⚠️ [worker {os.getpid()}] YouTube client not ready, uploads will retry it. Error: {e}")
+    print(f"🔥 [worker {os.getpid()}] Warm and ready for '{channel}' jobs.")
+
+
+def _render_one(run_id: str, privacy: str, upload: bool) -> dict:
+    """Runs one video through the warm channel pipeline. Executed inside a worker process."""
+    started = time.time()
+    try:
+        summary = _channel_module.run_pipeline('2' if upload else '1', run_id, privacy_status=privacy)
+        ok = bool(summary['video_id']) or not upload
+        return {**summary, 'ok': ok, 'seconds': round(time.time() - started, 1)}
+    except (Exception, SystemExit) as e:  # exit() in a stage raises SystemExit, which must not kill the worker
+        traceback.print_exc()
+        return {'run_id': run_id, 'ok': False, 'error': str(e), 'seconds': round(time.time() - started, 1)}
+
+
+def _read_job(name: str, channel: str) -> dict:
+    """Reads a job file from processing/ and checks it. Raises ValueError saying what is wrong with it."""
+    try:
+        with open(spool_path('processing', name), 'r', encoding='utf-8') as f:
+            job = json.load(f)
+    except (OSError, ValueError) as e:  # JSONDecodeError and UnicodeDecodeError are ValueErrors
+        raise ValueError(f"the job file can't be read ({e})")
+    if not isinstance(job, dict):
+        raise ValueError("the job file must hold a JSON object")
+    if job.get('channel', channel) != channel:
+        raise ValueError(f"the job is for channel '{job.get('channel')}', this daemon serves '{channel}'")
+    count = job.setdefault('count', 1)
+    if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+        raise ValueError(f"count must be a positive integer, got {count!r}")
+    privacy = job.setdefault('privacy', 'public')
+    if privacy not in PRIVACY_STATUSES:
+        raise ValueError(f"privacy must be one of {PRIVACY_STATUSES}, got {privacy!r}")
+    if not isinstance(job.setdefault('upload', True), bool):
+        raise ValueError(f"upload must be true or false, got {job['upload']!r}")
+    return job
+
+
+def _reject_job(job_name: str, error: str):
+    """Moves a job the daemon can't run to failed/, with the error and the file as it was."""
+    with open(spool_path('processing', job_name), 'r', encoding='utf-8', errors='replace') as f:
+        content = f.read()
+    with open(spool_path('failed', job_name), 'w', encoding='utf-8') as f:
+        json.dump({'error': error, 'job_file': content}, f, indent=2)
+    os.remove(spool_path('processing', job_name))
+    print(f"❌ Job {job_name} rejected: {error}")
+
+
+def _start_pool(channel: str, workers: int, budget: tuple) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker, initargs=(channel, *budget))
+
+
+def _crashed(future: Future) -> bool:
+    """True once a future's worker process has died (or it was cancelled when its broken pool was shut down)."""
+    return future.done() and (future.cancelled() or isinstance(future.exception(), BrokenProcessPool))
+
+
+def _finish_job(job_name: str, job: dict, results: list):
+    job['results'] = results
+    state = 'done' if all(result['ok'] for result in results) else 'failed'
+    with open(spool_path(state, job_name), 'w', encoding='utf-8') as f:
+        json.dump(job, f, indent=2)
+    os.remove(spool_path('processing', job_name))
+    print(f"{'✅' if state == 'done' else '❌'} Job {job_name} finished: "
+          f"{sum(result['ok'] for result in results)}/{len(results)} videos succeeded.")
+
+
+def serve(channel: str = 'spirit', workers: int = 2):
+    """Keeps a pool of warm workers running and feeds them jobs from the spool until interrupted."""
+    print(f"\n🛠️ --- Render daemon for '{channel}' with {workers} warm worker(s) ---")
+    print(f"   Drop jobs into {spool_path('incoming')} or run: python render_daemon.py submit --count N")
+
+    # Jobs left in processing/ by a crashed daemon are picked up again. Their run IDs are
+    # stable, so checkpointed stages are skipped instead of being redone.
+    for name in os.listdir(spool_path('processing')):
+        os.replace(spool_path('processing', name), spool_path('incoming', name))
+
+    pending = {}  # job file name -> (job, {run ID: future})
+    crashes = {}  # run ID -> times its worker process died
+    started = set()  # Run IDs handed to a worker as of the last poll: the suspects when the pool breaks
+    # Spawn-context primitives: a worker's split render (split_render.py) passes them on to its
+    # spawned segment processes, which fork-context locks can't be
+    spawn = multiprocessing.get_context('spawn')
+    budget = (spawn.Condition(), spawn.Value('q', 0))
+    pool = _start_pool(channel, workers, budget)
+    try:
+        while True:
+            for name in sorted(os.listdir(spool_path('incoming'))):
+                if not name.endswith('.json'):
+                    continue
+                os.replace(spool_path('incoming', name), spool_path('processing', name))
+                try:
+                    job = _read_job(name, channel)
+                except ValueError as e:
+                    # Rejected for good: left in processing/ it would be retried on every restart
+                    _reject_job(name, str(e))
+                    continue
+
+                job_id = os.path.splitext(name)[0]
+                print(f"📥 Job {name}: {job['count']} video(s), privacy '{job['privacy']}'")
+                futures = {}
+                for i in range(job['count']):
+                    run_id = f"{job_id}-{i + 1}"
+                    futures[run_id] = pool.submit(_render_one, run_id, job['privacy'], job['upload'])
+                pending[name] = (job, futures)
+
+            # A worker that dies takes the whole pool down with it: start a new one and retry its videos
+            if any(_crashed(future) for _, futures in pending.values() for future in futures.values()):
+                print("⚠️ A worker process died. Starting a new pool.")
+                pool.shutdown(wait=True, cancel_futures=True)  # Every future of the old pool is settled after this
+                pool = _start_pool(channel, workers, budget)
+                for job, futures in pending.values():
+                    for run_id, future in futures.items():
+                        if not _crashed(future):
+                            continue
+                        if run_id in started or not started:
+                            crashes[run_id] = crashes.get(run_id, 0) + 1
+                        if crashes.get(run_id, 0) <= WORKER_CRASH_RETRIES:
+                            futures[run_id] = pool.submit(_render_one, run_id, job['privacy'], job['upload'])
+                        else:
+                            futures[run_id] = Future()
+                            futures[run_id].set_result({'run_id': run_id, 'ok': False,
+                                                        'error': f"its worker process died {crashes[run_id]} times"})
+
+            for name, (job, futures) in list(pending.items()):
+                if all(future.done() for future in futures.values()):
+                    _finish_job(name, job, [future.result() for future in futures.values()])
+                    del pending[name]
+
+            started = {run_id for _, futures in pending.values()
+                       for run_id, future in futures.items() if future.running()}
+            time.sleep(POLL_SECONDS)
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down. Unfinished jobs stay in processing/ and resume on the next start.")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Long-running render daemon with warm clients")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Run the daemon")
+    serve_parser.add_argument('--channel', default='spirit', choices=sorted(CHANNEL_MODULES))
+    serve_parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+
+    submit_parser = commands.add_parser('submit', help="Queue a job for a running daemon")
+    submit_parser.add_argument('--channel', default='spirit', choices=sorted(CHANNEL_MODULES))
+    submit_parser.add_argument('--count', type=int, default=1)
+    submit_parser.add_argument('--privacy', default='public', choices=PRIVACY_STATUSES)
+    submit_parser.add_argument('--local-only', action='store_true', help="Render and log without uploading")
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.channel, args.workers)
+    else:
+        path = submit_job(args.channel, args.count, args.privacy, upload=not args.local_only)
+        print(f"✅ Queued {path}")
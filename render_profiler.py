@@ -0,0 +1,155 @@
+import os
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Opt-in profiling for renders: every stage that touches a frame (decode, zoom, each
+# overlay layer, the encoder write) is timed per frame, with the memory it allocated.
+# Stages nest per thread, so the result reads as a flame graph: each sink thread is a root.
+PROFILE_ENV_VAR = 'RENDER_PROFILE'
+TRACE_FRAMES = 1  # Stack depth tracemalloc keeps per allocation; 1 is enough and keeps it cheap
+
+
+def profiling_enabled() -> bool:
+    return os.getenv(PROFILE_ENV_VAR, '0') == '1'
+
+
+def stage_timer(profiler):
+    """Returns profiler.stage, or a no-op stand-in when profiling is off."""
+    return profiler.stage if profiler else (lambda name: nullcontext())
+
+
+class RenderProfiler:
+    """
+    Collects per-stage frame times and allocations.
+
+    Stages are keyed by their full stack ("variant-1;composite;part1"), and store self time
+    (time not spent in nested stages), so the folded output can go straight into
+    flamegraph.pl or speedscope. Allocations come from tracemalloc's traced-memory counter,
+    which is process-wide, so while they are traced (`lockstep`) the render hands each frame
+    to one sink at a time instead of overlapping them. Times per stage stay meaningful either way.
+    """
+
+    def __init__(self, trace_allocations: bool = True):
+        self.trace_allocations = trace_allocations
+        self.lockstep = trace_allocations
+        self.stats = {}  # stack -> {'calls', 'self_seconds', 'total_seconds', 'allocated_bytes'}
+        self.peak_bytes = 0
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = None
+
+    def start(self):
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.wall_seconds = time.perf_counter() - self._started
+        if tracemalloc.is_tracing():
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, 'stack'):
+            # Each thread is its own root, e.g. the decode loop vs. every variant's sink
+            self._local.stack = [{'name': threading.current_thread().name, 'child_seconds': 0.0}]
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times one execution of a stage (for one frame) and attributes it to the current stack."""
+        stack = self._stack()
+        entry = {'name': name, 'child_seconds': 0.0}
+        stack.append(entry)
+        tracing = tracemalloc.is_tracing()
+        allocated_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            allocated = max(tracemalloc.get_traced_memory()[0] - allocated_before, 0) if tracing else 0
+            key = ';'.join(frame['name'] for frame in stack)
+            stack.pop()
+            stack[-1]['child_seconds'] += elapsed
+            with self._lock:
+                stats = self.stats.setdefault(key, {'calls': 0, 'self_seconds': 0.0, 'total_seconds': 0.0,
+                                                    'allocated_bytes': 0})
+                stats['calls'] += 1
+                stats['self_seconds'] += elapsed - entry['child_seconds']
+                stats['total_seconds'] += elapsed
+                stats['allocated_bytes'] += allocated
+
+    def wrap_frames(self, name: str, frames):
+        """Wraps a frame producer so producing each frame (everything inside next()) is one stage."""
+        iterator = iter(frames)
+        try:
+            while True:
+                with self.stage(name):
+                    item = next(iterator, None)
+                if item is None:
+                    return
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def wrap_clip(self, clip, name: str):
+        """Wraps a moviepy clip so each get_frame() call is a stage; nested clips nest in the stack."""
+        def timed_frame(get_frame, t):
+            if len(self._stack()) == 1:
+                # moviepy probes frame 0 while building clips; only frames produced for the render count
+                return get_frame(t)
+            with self.stage(name):
+                return get_frame(t)
+        return clip.fl(timed_frame)
+
+    def folded_stacks(self) -> list[str]:
+        """Lines of "root;stage;substage microseconds", the input format of flamegraph tools."""
+        return [f"{key} {int(stats['self_seconds'] * 1e6)}"
+                for key, stats in sorted(self.stats.items()) if stats['self_seconds'] > 0]
+
+    def write_folded(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.folded_stacks()) + '\n')
+
+    def report(self) -> str:
+        """A per-stage table: frames, time per frame, the fps that stage alone could sustain, allocations."""
+        lines = [f"{'stage':<52} {'frames':>6} {'ms/frame':>9} {'self ms':>8} {'max fps':>8} {'alloc MB':>9}"]
+        for key, stats in sorted(self.stats.items(), key=lambda item: -item[1]['total_seconds']):
+            per_frame = stats['total_seconds'] / stats['calls']
+            lines.append(f"{key:<52} {stats['calls']:>6} {per_frame * 1000:>9.2f} "
+                         f"{stats['self_seconds'] / stats['calls'] * 1000:>8.2f} "
+                         f"{(1 / per_frame if per_frame else float('inf')):>8.1f} "
+                         f"{stats['allocated_bytes'] / 2**20:>9.1f}")
+        lines.append(f"Wall time {self.wall_seconds:.2f}s"
+                     + (f", traced peak memory {self.peak_bytes / 2**20:.1f} MB" if self.peak_bytes else ""))
+        return '\n'.join(lines)
+
+
+# Run this file directly to profile a render of a sample script.
+if __name__ == '__main__':
+    import argparse
+    from video_renderer import generate_video_variants
+    parser = argparse.ArgumentParser(description="Profile one render stage by stage")
+    parser.add_argument('template', help="Background template, e.g. spirit_temp/candles_spirit.mp4")
+    parser.add_argument('music', help="Music track, e.g. spirit_music/track.mp3")
+    parser.add_argument('--output', default='profile_render.mp4')
+    parser.add_argument('--no-alloc', action='store_true', help="Skip tracemalloc (times only, lower overhead)")
+    args = parser.parse_args()
+
+    profiler = RenderProfiler(trace_allocations=not args.no_alloc)
+    profiler.start()
+    try:
+        generate_video_variants([{'part1': "The quieter you become, the more you are able to hear.",
+                                  'part2': "Stillness is where the answers have been waiting."}],
+                                [args.output], music_path=args.music, video_path=args.template, profiler=profiler)
+    finally:
+        profiler.stop()
+    print(profiler.report())
+    folded_path = os.path.splitext(args.output)[0] + '.folded'
+    profiler.write_folded(folded_path)
+    print(f"✅ Flame graph stacks saved to {folded_path} (feed them to flamegraph.pl or speedscope)")
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import numpy as np
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from moviepy.config import get_setting
+from video_renderer import FRAME_WIDTH, FRAME_HEIGHT, generate_video_variants
+
+# Renders fixed scripts over small synthetic templates and compares the result with what
+# was recorded last time: sampled frames (PSNR) and render time / peak memory (thresholds).
+# Fixtures are generated by ffmpeg on demand. Golden frames and baseline depend on the machine
+# (fonts, ImageMagick, CPU), so they aren't committed: record them with --update on the commit
+# you start from, then check your changes on the same machine. CI does this for every pull
+# request (.github/workflows/render_regression.yml).
+REGRESSION_FOLDER = 'regression'
+FIXTURE_FOLDER = os.path.join(REGRESSION_FOLDER, 'fixtures')
+GOLDEN_FOLDER = os.path.join(REGRESSION_FOLDER, 'golden')
+BASELINE_FILE = os.path.join(REGRESSION_FOLDER, 'baseline.json')
+
+# ffmpeg lavfi sources. Both are shorter than a video, so the loop is exercised too.
+FIXTURE_TEMPLATES = {
+    'testsrc': 'testsrc2=size=1080x1920:rate=24:duration=5',
+    'bars': 'smptehdbars=size=1080x1920:rate=24:duration=4',
+}
+FIXTURE_MUSIC = 'sine=frequency=220:sample_rate=44100:duration=14'
+
+REGRESSION_CASES = {
+    'short_quote': {'template': 'testsrc',
+                    'variant': {'part1': "Peace comes from within.", 'part2': "Do not seek it without."}},
+    'long_quote': {'template': 'bars',
+                   'variant': {'part1': "The person you see in the mirror is not the whole of who you are, "
+                                        "only the part that the light happens to reach today.",
+                               'part2': "Look a little longer and the rest begins to show.",
+                               'heading': "Wisdom", 'timing': {'part1_fade_in': 0.5}}},
+}
+
+# Fade in, first caption, second caption (just after the switch) and the looped background
+SAMPLE_TIMES = (0.5, 3.0, 6.5, 11.5)
+GOLDEN_SCALE = 4  # Golden frames are stored at 1/4 size, which still catches layout and colour drift
+MIN_PSNR_DB = 35.0
+TIME_TOLERANCE = 0.30  # Fail if a render gets more than 30% slower than the baseline
+MEMORY_TOLERANCE = 0.15
+
+
+def ensure_fixtures() -> dict:
+    """Generates the fixture templates and music track with ffmpeg if they don't exist yet."""
+    os.makedirs(FIXTURE_FOLDER, exist_ok=True)
+    paths = {name: os.path.join(FIXTURE_FOLDER, f"{name}.mp4") for name in FIXTURE_TEMPLATES}
+    paths['music'] = os.path.join(FIXTURE_FOLDER, 'tone.m4a')
+    sources = {**FIXTURE_TEMPLATES, 'music': FIXTURE_MUSIC}
+    for name, path in paths.items():
+        if os.path.exists(path):
+            continue
+        codec_args = ['-c:a', 'aac', '-b:a', '128k'] if name == 'music' else ['-c:v', 'libx264', '-preset', 'medium',
+                                                                            '-crf', '18', '-pix_fmt', 'yuv420p']
+        cmd = [get_setting("FFMPEG_BINARY"), '-y', '-v', 'error', '-f', 'lavfi', '-i', sources[name]] + codec_args + [path]
+        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return paths
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process, or None where the resource module doesn't exist."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def render_case(case_name: str, output_path: str) -> dict:
+    """Renders one case. Runs in a fresh process so its peak memory is its own."""
+    case = REGRESSION_CASES[case_name]
+    fixtures = ensure_fixtures()
+    started = time.perf_counter()
+    generate_video_variants([case['variant']], [output_path], music_path=fixtures['music'],
+                            video_path=fixtures[case['template']])
+    return {'seconds': round(time.perf_counter() - started, 2), 'peak_memory_mb': peak_memory_mb()}
+
+
+def extract_frame(video_path: str, t: float) -> np.ndarray:
+    """Decodes the frame at t seconds and shrinks it to golden-frame size."""
+    cmd = [get_setting("FFMPEG_BINARY"), '-v', 'error', '-ss', str(t), '-i', video_path, '-frames:v', '1',
+           '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    raw = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+    frame = np.frombuffer(raw, dtype=np.uint8)[:FRAME_WIDTH * FRAME_HEIGHT * 3].reshape(FRAME_HEIGHT, FRAME_WIDTH, 3)
+    height, width = FRAME_HEIGHT // GOLDEN_SCALE, FRAME_WIDTH // GOLDEN_SCALE
+    return frame.reshape(height, GOLDEN_SCALE, width, GOLDEN_SCALE, 3).mean(axis=(1, 3)).round().astype(np.uint8)
+
+
+def psnr(reference: np.ndarray, frame: np.ndarray) -> float:
+    mse = np.mean((reference.astype(np.float64) - frame.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def golden_path(case_name: str, t: float) -> str:
+    return os.path.join(GOLDEN_FOLDER, f"{case_name}_{int(t * 1000):05d}ms.png")
+
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_case(case_name: str, video_path: str, metrics: dict, baseline: dict) -> list[str]:
+    """Returns a list of failures for one rendered case (empty if it matches)."""
+    failures = []
+    for t in SAMPLE_TIMES:
+        path = golden_path(case_name, t)
+        if not os.path.exists(path):
+            failures.append(f"no golden frame at {t}s (run with --update on the base commit first)")
+            continue
+        score = psnr(np.asarray(Image.open(path).convert('RGB')), extract_frame(video_path, t))
+        if score < MIN_PSNR_DB:
+            failures.append(f"frame at {t}s drifted: PSNR {score:.1f} dB < {MIN_PSNR_DB} dB")
+
+    recorded = baseline.get('cases', {}).get(case_name)
+    if not recorded:
+        failures.append("no performance baseline (run with --update on the base commit first)")
+        return failures
+    if baseline.get('machine') != platform.node():
+        print(f"  ⚠️ Baseline was recorded on '{baseline.get('machine')}', timings may not be comparable.")
+    time_limit = recorded['seconds'] * (1 + TIME_TOLERANCE)
+    if metrics['seconds'] > time_limit:
+        failures.append(f"render took {metrics['seconds']}s, limit {time_limit:.1f}s (baseline {recorded['seconds']}s)")
+    if metrics['peak_memory_mb'] and recorded.get('peak_memory_mb'):
+        memory_limit = recorded['peak_memory_mb'] * (1 + MEMORY_TOLERANCE)
+        if metrics['peak_memory_mb'] > memory_limit:
+            failures.append(f"peak memory {metrics['peak_memory_mb']} MB, limit {memory_limit:.0f} MB "
+                            f"(baseline {recorded['peak_memory_mb']} MB)")
+    return failures
+
+
+def record_case(case_name: str, video_path: str):
+    """Saves the sampled frames of a render as the new golden frames."""
+    os.makedirs(GOLDEN_FOLDER, exist_ok=True)
+    for t in SAMPLE_TIMES:
+        Image.fromarray(extract_frame(video_path, t)).save(golden_path(case_name, t))
+
+
+def run_regression(case_names: list = None, update: bool = False) -> bool:
+    """Renders every case and checks (or with update=True, records) frames and performance. True if all pass."""
+    case_names = case_names or sorted(REGRESSION_CASES)
+    ensure_fixtures()
+    output_folder = os.path.join(REGRESSION_FOLDER, 'output')
+    os.makedirs(output_folder, exist_ok=True)
+    baseline = load_baseline()
+    new_cases, all_passed = {}, True
+
+    for case_name in case_names:
+        video_path = os.path.join(output_folder, f"{case_name}.mp4")
+        print(f"\n--- {case_name} ---")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            metrics = pool.submit(render_case, case_name, video_path).result()
+        print(f"  Rendered in {metrics['seconds']}s, peak memory {metrics['peak_memory_mb']} MB")
+        new_cases[case_name] = metrics
+
+        if update:
+            record_case(case_name, video_path)
+            print(f"  ✅ Recorded golden frames and baseline for {case_name}")
+            continue
+        failures = check_case(case_name, video_path, metrics, baseline)
+        for failure in failures:
+            print(f"  ❌ {failure}")
+        if not failures:
+            print(f"  ✅ {case_name} matches its golden frames and performance baseline")
+        all_passed = all_passed and not failures
+
+    if update:
+        baseline = {'machine': platform.node(), 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'cases': {**baseline.get('cases', {}), **new_cases}}
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+    return all_passed
+
+
+# Run this file directly to check renders against the golden frames and baseline. Before a
+# change: `python render_regression.py --update` on the unchanged tree; after it: run it again
+# without --update. After an intended visual or performance change, re-record with --update.
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Render regression check: golden frames and performance thresholds")
+    parser.add_argument('cases', nargs='*', help=f"Cases to run (default: all of {', '.join(sorted(REGRESSION_CASES))})")
+    parser.add_argument('--update', action='store_true', help="Record new golden frames and baseline instead of checking")
+    args = parser.parse_args()
+    unknown = [name for name in args.cases if name not in REGRESSION_CASES]
+    if unknown:
+        exit(f"❌ Unknown case(s): {', '.join(unknown)}. Available: {', '.join(sorted(REGRESSION_CASES))}")
+
+    if run_regression(args.cases, args.update):
+        print("\n✅ Render regression check passed.")
+    else:
+        exit("\n❌ Render regression check failed.")
@@ -0,0 +1,154 @@
+import os
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import traceback
+from job_store import DEFAULT_LEASE_SECONDS, open_job_store
+from render_daemon import CHANNEL_MODULES
+from run_checkpoints import file_sha256
+from encode_profiles import DEFAULT_PROFILE
+from video_renderer import generate_video_with_music, select_media
+
+# Render workers for spreading renders over several machines. Every host runs
+# `python render_worker.py work` against the same job store (a SQLite file on a shared
+# volume) and writes finished videos into a shared folder, one subfolder per channel.
+# While a worker renders it heartbeats its lease; if it dies, the lease runs out and
+# another worker picks the job up again.
+JOB_STORE = os.getenv('JOB_STORE', 'jobs.db')
+SHARED_OUTPUT_FOLDER = os.getenv('SHARED_OUTPUT_DIR', 'shared_renders')
+POLL_SECONDS = 5
+HEARTBEATS_PER_LEASE = 3  # A couple of missed heartbeats don't cost the lease yet
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def submit_render(store, part1: str, part2: str, channel: str = 'spirit', template: str = None, music: str = None,
+                  title: str = None, encode_profile: str = DEFAULT_PROFILE) -> int:
+    """Queues one render. Without a template (or music), the worker picks one like a normal run."""
+    if channel not in CHANNEL_MODULES:
+        raise ValueError(f"Unknown channel '{channel}'. Available: {', '.join(CHANNEL_MODULES)}")
+    payload = {'part1': part1, 'part2': part2, 'title': title, 'template': template, 'music': music,
+               'encode_profile': encode_profile}
+    return store.submit(channel, payload)
+
+
+def _keep_lease(store, job_id: int, worker: str, lease_seconds: float, stop: threading.Event, lost: threading.Event):
+    while not stop.wait(lease_seconds / HEARTBEATS_PER_LEASE):
+        try:
+            if not store.heartbeat(job_id, worker, lease_seconds):
+                print(f"⚠️ Lost the lease on job {job_id}; another worker may be rendering it now.")
+                lost.set()
+                return
+        except sqlite3.Error as e:  # The shared volume hiccuped; the next heartbeat may still make it
+            print(f"⚠️ Heartbeat for job {job_id} failed. Error: {e}")
+
+
+def render_job(job: dict, output_folder: str, worker: str) -> dict:
+    """
+    Renders a claimed job under a temporary name in the shared folder and returns its result
+    record. The video only gets its final name once the job is completed (see run_worker).
+    """
+    payload = job['payload']
+    music_path, video_path = payload.get('music'), payload.get('template')
+    if not music_path or not video_path:
+        chosen_music, chosen_template = select_media()
+        music_path, video_path = music_path or chosen_music, video_path or chosen_template
+
+    folder = os.path.join(output_folder, job['channel'])
+    os.makedirs(folder, exist_ok=True)
+    output_path = os.path.join(folder, f"job_{job['id']}.mp4")
+    # Rendered under a worker-specific name, so a reclaimed job's two renders never mix
+    temp_path = os.path.join(folder, f".job_{job['id']}_{worker}.mp4")
+    started = time.time()
+    try:
+        generate_video_with_music(payload['part1'], payload['part2'], temp_path,
+                                  encode_profile=payload.get('encode_profile', DEFAULT_PROFILE),
+                                  music_path=music_path, video_path=video_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return {'video': output_path, 'temp_video': temp_path, 'sha256': file_sha256(temp_path),
+            'size_bytes': os.path.getsize(temp_path), 'template': video_path, 'music': music_path, 'worker': worker,
+            'seconds': round(time.time() - started, 1)}
+
+
+def run_worker(store, output_folder: str = SHARED_OUTPUT_FOLDER, worker: str = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS, once: bool = False) -> int:
+    """
+    Claims and renders jobs until interrupted (or, with once=True, until the store has none left).
+
+    Returns:
+        int: the number of jobs this worker completed.
+    """
+    worker = worker or worker_name()
+    print(f"🛠️ Render worker {worker}: jobs from {getattr(store, 'path', store)}, videos to {output_folder}")
+    completed = 0
+    while True:
+        job = store.claim(worker, lease_seconds)
+        if job is None:
+            if once:
+                return completed
+            time.sleep(POLL_SECONDS)
+            continue
+
+        print(f"📥 Job {job['id']} ({job['channel']}, attempt {job['attempts']}): {job['payload']['part1'][:50]}...")
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=_keep_lease, args=(store, job['id'], worker, lease_seconds, stop, lost),
+                                     name=f"heartbeat-{job['id']}", daemon=True)
+        heartbeat.start()
+        try:
+            result = render_job(job, output_folder, worker)
+            temp_video = result.pop('temp_video')
+            # A worker that lost its lease leaves the job (and its final file) to the one that reclaimed it
+            if not lost.is_set() and store.complete(job['id'], worker, result):
+                os.replace(temp_video, result['video'])  # Only the worker whose result was recorded names the file
+                completed += 1
+                print(f"✅ Job {job['id']} done in {result['seconds']}s: {result['video']}")
+            else:
+                os.remove(temp_video)
+                print(f"⚠️ Job {job['id']} was reclaimed while rendering; its render was discarded.")
+        except KeyboardInterrupt:
+            store.fail(job['id'], worker, "worker interrupted")
+            raise
+        except BaseException as e:  # exit() in media selection raises SystemExit, which must not kill the worker
+            traceback.print_exc()
+            store.fail(job['id'], worker, str(e) or type(e).__name__)
+            print(f"❌ Job {job['id']} failed: {e}")
+        finally:
+            stop.set()
+            heartbeat.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render workers sharing one job store")
+    parser.add_argument('--store', default=JOB_STORE, help="SQLite job store on a shared volume (or 'memory').")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    work_parser = commands.add_parser('work', help="Claim and render jobs")
+    work_parser.add_argument('--output', default=SHARED_OUTPUT_FOLDER, help="Shared folder for finished videos")
+    work_parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS)
+    work_parser.add_argument('--once', action='store_true', help="Exit when no job is left instead of polling")
+
+    submit_parser = commands.add_parser('submit', help="Queue a render")
+    submit_parser.add_argument('part1')
+    submit_parser.add_argument('part2')
+    submit_parser.add_argument('--channel', default='spirit', choices=sorted(CHANNEL_MODULES))
+    submit_parser.add_argument('--template', help="Background template path (default: the next in sequence)")
+    submit_parser.add_argument('--title')
+
+    commands.add_parser('status', help="Show job counts per status")
+
+    args = parser.parse_args()
+    store = open_job_store(args.store)
+    if args.command == 'work':
+        run_worker(store, args.output, lease_seconds=args.lease_seconds, once=args.once)
+    elif args.command == 'submit':
+        job_id = submit_render(store, args.part1, args.part2, args.channel, args.template, title=args.title)
+        print(f"✅ Queued job {job_id} in {args.store}")
+    else:
+        print(store.counts() or "No jobs yet.")
@@ -0,0 +1,57 @@
+import os
+import json
+import time
+import hashlib
+
+# Every pipeline run gets its own folder here. Each finished stage leaves a <stage>.json
+# file behind, so re-running with the same run ID skips the work that is already done.
+RUNS_FOLDER = 'runs'
+
+
+def new_run_id() -> str:
+    """Returns a fresh, sortable run ID."""
+    return str(int(time.time()))
+
+
+def run_folder(run_id: str, runs_folder: str = RUNS_FOLDER) -> str:
+    """Returns (and creates) the folder that holds a run's checkpoints and outputs."""
+    folder = os.path.join(runs_folder, run_id)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def load_checkpoint(run_id: str, stage: str, runs_folder: str = RUNS_FOLDER):
+    """Returns the saved output of a stage, or None if the stage hasn't completed yet."""
+    path = os.path.join(runs_folder, run_id, f"{stage}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Checkpoint '{path}' is unreadable, the '{stage}' stage will run again. Error: {e}")
+        return None
+
+
+def save_checkpoint(run_id: str, stage: str, data: dict, runs_folder: str = RUNS_FOLDER):
+    """Marks a stage as complete by atomically writing its output to the run folder."""
+    path = os.path.join(run_folder(run_id, runs_folder), f"{stage}.json")
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({**data, 'completed_at': time.strftime('%Y-%m-%dT%H:%M:%S')}, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def file_sha256(path: str) -> str:
+    """Hashes a file in chunks so large videos don't have to fit in memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verified_render(checkpoint) -> bool:
+    """True if a render checkpoint still points at the exact file that was rendered."""
+    return bool(checkpoint and os.path.exists(checkpoint['video'])
+                and file_sha256(checkpoint['video']) == checkpoint['sha256'])
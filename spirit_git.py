@@ -1,33 +1,47 @@
 import os
-import gspread
-import google.generativeai as genai
 from dotenv import load_dotenv
-from oauth2client.service_account import ServiceAccountCredentials
-import time
-import random
-from moviepy.editor import *
 from moviepy.config import change_settings
 from google.generativeai.types import GenerationConfig
 # Add this with your other imports
-from upload_video import get_authenticated_service, upload_video
-from upload_video import get_authenticated_service, upload_video, update_video_details
+from upload_video import upload_video, update_video_details
+from video_renderer import FONT_PATH, generate_video_with_music, select_media
+from encode_profiles import ENCODE_PROFILES, DEFAULT_PROFILE
 import os
 import sys
-# --- SETUP AND AUTHENTICATION (Identical to previous version) ---
+import argparse
+from datetime import datetime, timedelta, timezone
+from run_checkpoints import new_run_id, run_folder, load_checkpoint, save_checkpoint, file_sha256, verified_render
+from bootstrap import start_clients, get_client, report_clients
+from upload_video import CREDENTIALS_PICKLE_FILE, video_body
+from streaming_upload import start_session, upload_growing_file, resume_upload, youtube_session
+import threading
+import requests
+from text_layout import glyph_metrics
+from theme_scheduler import load_theme_history, save_attempts, choose_theme, record_attempt
+from content_batch import build_quote_prompt, parse_quote_response, generate_quote_batch, normalize_fact
+from output_validator import validate_video
+# --- SETUP AND AUTHENTICATION ---
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'credentials.json'
 load_dotenv()
-try:
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-    gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-    print("✅ Gemini AI Authenticated Successfully.")
-except Exception as e: exit(f"❌ ERROR: Gemini AI Auth Failed. {e}")
-try:
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-    gspread_client = gspread.authorize(creds)
-    sheet = gspread_client.open("yt_story").sheet1
-    print("✅ Google Sheets Authenticated and Opened Successfully.")
-except Exception as e: exit(f"❌ ERROR: Google Sheets Auth Failed. {e}")
+# Gemini and Sheets handshakes start now, in the background (see bootstrap.py). YouTube is
+# only warmed up if a saved token exists; otherwise its first use runs the browser login.
+start_clients(['gemini', 'sheet'] + (['youtube'] if os.path.exists(CREDENTIALS_PICKLE_FILE) else []))
+
+
+# Scheduled (batch) videos go public at this UTC time, the same slot as the daily cron
+PUBLISH_TIME_UTC = '06:30'
+# YouTube rejects publishAt times that are too close; leave room for rendering and upload
+MIN_SCHEDULE_LEAD_MINUTES = 60
+
+# The YouTube client is built once per process and reused by every upload
+_youtube_service = None
+
+def get_youtube_service():
+    """Returns the process-wide YouTube client, authenticating on first use."""
+    global _youtube_service
+    if _youtube_service is None:
+        _youtube_service = get_client('youtube')
+    return _youtube_service
 
 
 # --- AI & AUTOMATION FUNCTIONS ---
@@ -79,83 +93,62 @@ def verify_media_files():
     return True
 
 
+def read_used_facts() -> list:
+    """Returns part1 of every fact already in the Google Sheet (empty if it can't be read)."""
+    try:
+        print("📚 Reading previously generated facts from Google Sheet...")
+        used_facts = get_client('sheet').col_values(1)[1:] 
+        print(f"  Found {len(used_facts)} previously used facts.")
+        return used_facts
+    except Exception as e:
+        print(f"⚠️ Could not read sheet history, proceeding without it. Error: {e}")
+        return []
+
 def create_quote_content() -> tuple[str, str, str]:
     """
     Generates a new, unique two-part spiritual fact, inspired by universal wisdom
     (such as from the Bhagavad Gita) without naming the source.
     """
     print("🧠 Activating AI Spiritual Facts generator...")
-    
-    try:
-        print("📚 Reading previously generated facts from Google Sheet...")
-        used_facts = sheet.col_values(1)[1:] 
-        history_list = "\n".join(f"- {fact}" for fact in used_facts)
-        print(f"  Found {len(used_facts)} previously used facts.")
-    except Exception as e:
-        print(f"⚠️ Could not read sheet history, proceeding without it. Error: {e}")
-        used_facts = []
-        history_list = "None."
+    used_facts = read_used_facts()
         
+    # Themes are picked by how much they've yielded so far and how often they repeat (theme_scheduler.py).
+    # This run's attempts are added to the saved history at the end, under its lock, so parallel
+    # runs don't overwrite each other's attempts or wait on each other's Gemini calls.
+    theme_history = load_theme_history()
+    tried_themes = []
+    attempts = []
+    # Same notion of a repeat as batch generation: case, punctuation and spacing don't make a fact new
+    seen = {normalize_fact(fact) for fact in used_facts}
+
     MAX_ATTEMPTS = 5
     for attempt in range(MAX_ATTEMPTS):
         print(f"🤖 Attempt {attempt + 1}/{MAX_ATTEMPTS}: Generating a new, unique spiritual fact...")
-        
-        # --- NEW THEME LIST FOR SPIRITUAL FACTS ---
-        themes = [
-            "the nature of the true self vs. the physical body", "the concept of performing your duty (dharma)",
-            "the law of action and reaction (karma)", "detachment from the results of your work",
-            "the illusion of the material world", "how to control the senses and the mind",
-            "the eternal, unchanging nature of the soul", "finding peace in a chaotic world",
-            "the idea that change is the only constant", "the three fundamental energies of nature (gunas)"
-        ]
-        chosen_theme = random.choice(themes)
+    
+        chosen_theme = choose_theme(theme_history, exclude=tried_themes)
+        tried_themes.append(chosen_theme)
         print(f"  Chosen Theme: {chosen_theme}")
 
-        # --- NEW PROMPT FOCUSED ON SPIRITUAL FACTS ---
-        master_prompt = f"""
-        You are an AI that distills deep spiritual wisdom, based on ancient Eastern philosophy, into simple, two-part insights for a modern audience.
-        Your insight MUST be about the specific theme of: **{chosen_theme}**.
-
-        CRITICAL RULES:
-        1.  Do NOT mention specific religious texts, scriptures, gods, or historical figures. Present the ideas as universal truths.
-        2.  Your language MUST be super simple, profound, and easy to understand.
-        3.  The first part must be a "hook". The second part must be the core "reveal".
-        4.  Do NOT generate an insight similar to any in the "PREVIOUSLY USED" list.
-        5.  Your ENTIRE response MUST be in the format below, with nothing else.
-
-        **GOOD EXAMPLES OF THE REQUIRED STYLE:**
-        * EXAMPLE 1 (Theme: the true self): `PART_1: The person you see in the mirror is not the real you…\nPART_2: …it is just the temporary vessel for the eternal energy that you truly are.\nTITLE: You Are Not Your Body`
-        * EXAMPLE 2 (Theme: detachment): `PART_1: You have a right to your actions…\nPART_2: …but you have no right to the results of those actions.\nTITLE: The Secret to Inner Peace`
-
-        **PREVIOUSLY USED INSIGHTS:**
-        {history_list}
-
-        **YOUR REQUIRED OUTPUT FORMAT:**
-        PART_1:
-        [The first part of the insight]
-
-        PART_2:
-        [The second part of the insight]
-
-        TITLE:
-        [The video title]
-        """
-        
+        # The prompt and the response format live in content_batch.py, shared with batch generation
+        master_prompt = build_quote_prompt(chosen_theme, used_facts)
         generation_config = GenerationConfig(temperature=0.8)
-        response = gemini_model.generate_content(master_prompt, generation_config=generation_config)
-        
+        response = get_client('gemini').generate_content(master_prompt, generation_config=generation_config)
+    
         try:
-            part1 = response.text.split("PART_2:")[0].replace("PART_1:", "").strip()
-            if part1 in used_facts:
+            part1, part2, title = parse_quote_response(response.text)
+            if normalize_fact(part1) in seen:
                 print(f"⚠️ AI generated a duplicate fact. Retrying...")
+                record_attempt(theme_history, chosen_theme, 'duplicate', attempts)
                 continue
-            part2 = response.text.split("TITLE:")[0].split("PART_2:")[1].strip()
-            title = response.text.split("TITLE:")[1].strip()
             print("✅ New, unique insight generated!")
+            record_attempt(theme_history, chosen_theme, 'fact', attempts)
+            save_attempts(attempts)
             return part1, part2, title
         except Exception as e:
             print(f"⚠️ Could not parse the AI's response on this attempt. Retrying... Error: {e}")
-            
+            record_attempt(theme_history, chosen_theme, 'error', attempts)
+        
+    save_attempts(attempts)
     print(f"❌ Failed to generate a unique insight after {MAX_ATTEMPTS} attempts.")
     return "Error", "Could not generate unique insight.", "Error"
 
@@ -176,125 +169,411 @@ RULES:
 Your comma-separated list of tags:
 """
     generation_config = GenerationConfig(temperature=0.7)
-    response = gemini_model.generate_content(prompt, generation_config=generation_config)
+    response = get_client('gemini').generate_content(prompt, generation_config=generation_config)
     
     tags = [tag.strip() for tag in response.text.split(',')]
     print(f"✅ Generated {len(tags)} extra tags.")
     return tags
 
-def generate_video_with_music(part1: str, part2: str, output_filename: str):
-    """Generates a video with a sequentially chosen background, music, subtitles, and a heading."""
-
-    print(f"🎬 Generating video with music for '{output_filename}'...")
-    VIDEO_DURATION = 12
-
-    # All of the Ken Burns Effect logic can be removed, as it's now part of the main block below.
-
-    # --- 1. Select Media (with new sequential logic) ---
-    try:
-        music_folder = 'spirit_music'
-        available_music = [f for f in os.listdir(music_folder) if f.endswith('.mp3')]
-        chosen_music_path = os.path.join(music_folder, random.choice(available_music))
-        print(f"🎵 Using music: {chosen_music_path}")
-        
-        background_video_folder = 'spirit_temp'
-        available_videos = sorted([f for f in os.listdir(background_video_folder) if f.endswith('.mp4')]) # Sorted for consistent order
-        
-        if not available_videos:
-            exit(f"❌ ERROR: No background videos found in '{background_video_folder}'.")
-
-        # --- NEW: SEQUENTIAL VIDEO SELECTION LOGIC ---
-        state_file = 'spirit_temp/last_video_index.txt'
-        last_index = -1
-        if os.path.exists(state_file):
-            with open(state_file, 'r') as f:
-                try:
-                    last_index = int(f.read())
-                except ValueError:
-                    last_index = -1 # Start from beginning if file is empty or corrupt
-
-        # Calculate the next index, looping back to 0 if at the end of the list
-        next_index = (last_index + 1) % len(available_videos)
-        
-        chosen_video_filename = available_videos[next_index]
-        chosen_video_path = os.path.join(background_video_folder, chosen_video_filename)
-
-        # Save the new index for the next run
-        with open(state_file, 'w') as f:
-            f.write(str(next_index))
-        
-        print(f"🔄 Sequentially selected video #{next_index + 1}: {chosen_video_path}")
-        # --- END OF NEW LOGIC ---
-
-    except Exception as e:
-        exit(f"❌ ERROR: Could not find media files. Details: {e}")
-
-    # --- 2. Load and Prepare Clips ---
-    music_clip = AudioFileClip(chosen_music_path).subclip(0, VIDEO_DURATION)
-    background_clip = VideoFileClip(chosen_video_path)
-    if background_clip.duration < VIDEO_DURATION:
-        background_clip = background_clip.loop(duration=VIDEO_DURATION)
-    final_background = background_clip.subclip(0, VIDEO_DURATION).resize(height=1920).crop(x_center=background_clip.w/2, width=1080)
-    
-    # The Ken Burns Effect can be here if you want it applied to all videos,
-    # or you can re-implement the conditional logic if needed.
-    final_background = final_background.resize(lambda t: 1 + 0.02 * t)
-    final_background = final_background.crop(x_center=final_background.w / 2, y_center=final_background.h / 2, width=1080, height=1920)
-
-    # --- 3. Create Permanent Heading ---
-    # The heading and text clip creation is the same as before.
-    print(" Adding permanent heading...")
-    heading_text = "Spirituality Teaches"
-    box_width = int(1080 * 0.7)
-    box_height = 110
-    vertical_position_percent = 0.20
-    vertical_pixel_position = int(1920 * vertical_position_percent)
-    final_position = ('center', vertical_pixel_position)
-    
-    font_path = 'fonts/ARLRDBD.TTF'
-    heading_bg = ColorClip(size=(box_width, box_height), color=(255, 255, 255)).set_position(final_position).set_duration(VIDEO_DURATION)
-    heading_clip = TextClip(heading_text, fontsize=75, color='black', font=font_path, size=heading_bg.size).set_position(final_position).set_duration(VIDEO_DURATION)
-
-    # --- 4. Create Animated and Fading Quote Clips ---
-    part1_duration = 6
-    part2_start_time = 6
-    part2_duration = 6
-    
-    quote_clip1 = TextClip(part1, fontsize=80, color='white', font=font_path, stroke_color='black', stroke_width=3,
-                           size=(1080 * 0.9, None), method='caption')
-    quote_clip1 = quote_clip1.set_position('center').set_duration(part1_duration)
-    quote_clip1 = quote_clip1.fx(vfx.fadein, 1).fx(vfx.fadeout, 0.5)
-
-    quote_clip2 = TextClip(part2, fontsize=80, color='white', font=font_path, stroke_color='black', stroke_width=3,
-                           size=(1080 * 0.9, None), method='caption')
-    quote_clip2 = quote_clip2.set_position('center').set_start(part2_start_time).set_duration(part2_duration)
-    quote_clip2 = quote_clip2.fx(vfx.fadein, 0.5)
-
-    # --- 5. Composite Final Video ---
-    print(" Compositing final video...")
-    final_video = CompositeVideoClip(
-        [final_background, heading_bg, heading_clip, quote_clip1, quote_clip2]
-    ).set_duration(VIDEO_DURATION)
-    
-    final_video = final_video.set_audio(music_clip)
-    final_video.write_videofile(output_filename, fps=24, codec='libx264', threads=4)
-    print(f"✅ Video saved successfully as {output_filename}")
-    
-        
 def log_to_sheet(part1: str, part2: str, title: str, filename: str, status: str):
     """Adds the details of the generated video to the Google Sheet."""
     print(f"✍️ Logging details to Google Sheet...")
     try:
         # This new_row now uses the 'status' variable we pass to it
         new_row = [part1, part2, title, filename, status]
-        sheet.append_row(new_row)
+        get_client('sheet').append_row(new_row)
         print("✅ Logged to Google Sheet successfully.")
+        return True
     except Exception as e:
         print(f"⚠️ Could not log to Google Sheet. Details: {e}")
+        return False
+
+# --- CHECKPOINTED PIPELINE STAGES ---
+# Each stage saves its output to runs/<run_id>/<stage>.json. Re-running with the same
+# run ID picks up the saved output instead of spending Gemini tokens or CPU minutes again.
+
+def stage_generate_content(run_id: str) -> dict:
+    """STAGE 1: Generates the two-part insight and title (skipped if already checkpointed)."""
+    print("\n--- STAGE 1: GENERATING CONTENT ---")
+    content = load_checkpoint(run_id, 'content')
+    if content:
+        print(f"⏭️ Reusing content from run {run_id}: {content['title']}")
+        return content
+
+    try:
+        get_client('gemini')
+    except Exception as e:
+        exit(f"❌ ERROR: Gemini AI is unavailable, cannot generate content. {e}")
+    part1, part2, title = create_quote_content()
+    if part1 == "Error":
+        exit("❌ Failed to generate content from AI. Halting execution.")
+    content = {'part1': part1, 'part2': part2, 'title': title}
+    save_checkpoint(run_id, 'content', content)
+    print(f"✅ Content Generated: {title}")
+    return content
+
+def stage_generate_content_batch(run_ids: list[str]):
+    """
+    STAGE 1 (batch): Generates the content of every run that has none yet with concurrent,
+    rate-limited Gemini requests, so a batch waits about one round-trip instead of one per video.
+    Runs it couldn't fill are left to stage_generate_content.
+    """
+    missing = [run_id for run_id in run_ids if not load_checkpoint(run_id, 'content')]
+    if not missing:
+        return
+    print(f"\n--- STAGE 1 (BATCH): GENERATING CONTENT FOR {len(missing)} VIDEOS ---")
+    try:
+        model = get_client('gemini')
+    except Exception as e:
+        print(f"⚠️ Gemini AI is unavailable, leaving content to the per-video stage. {e}")
+        return
+    used_facts = read_used_facts()
+    attempts = []
+    contents = generate_quote_batch(model, len(missing), used_facts, load_theme_history(), attempts=attempts)
+    save_attempts(attempts)
+    for run_id, content in zip(missing, contents):
+        save_checkpoint(run_id, 'content', content)
+        print(f"✅ Content for {run_id}: {content['title']}")
+
+def run_media(run_id: str) -> tuple[str, str]:
+    """
+    The (music, template) of a run, picked once and checkpointed: drafts and the final render
+    of a run use the same media, and only the first pick advances the template rotation.
+    """
+    media = load_checkpoint(run_id, 'media')
+    if media and os.path.exists(media['music']) and os.path.exists(media['template']):
+        return media['music'], media['template']
+    music_path, video_path = select_media()
+    save_checkpoint(run_id, 'media', {'music': music_path, 'template': video_path})
+    return music_path, video_path
+
+def stage_render_video(run_id: str, content: dict, encode_profile: str = DEFAULT_PROFILE) -> dict:
+    """STAGE 2: Renders the video into the run folder (skipped if the rendered file is intact)."""
+    print("\n--- STAGE 2: GENERATING VIDEO ---")
+    render = load_checkpoint(run_id, 'render')
+    if verified_render(render):
+        print(f"⏭️ Reusing rendered video from run {run_id}: {render['video']}")
+        return render
+    if render:
+        print("⚠️ The checkpointed video is missing or was modified. Rendering again...")
+
+    output_filename = os.path.join(run_folder(run_id), f"quote_{run_id}.mp4")
+    music_path, video_path = run_media(run_id)
+    generate_video_with_music(content['part1'], content['part2'], output_filename, encode_profile=encode_profile,
+                              music_path=music_path, video_path=video_path)
+    # Checked once, right after rendering (the render cache's check of the same file is reused);
+    # the upload stage reads the result from the checkpoint instead of decoding the video again
+    problems = validate_video(output_filename)
+    render = {'video': output_filename, 'sha256': file_sha256(output_filename), 'encode_profile': encode_profile,
+              'size_bytes': os.path.getsize(output_filename), 'problems': problems}
+    save_checkpoint(run_id, 'render', render)
+    return render
+
+def stage_render_draft(run_id: str, content: dict, draft: str) -> str:
+    """STAGE 2 (draft): Renders a quick preview into the run folder. Never checkpointed, so it always re-renders."""
+    print(f"\n--- STAGE 2: GENERATING DRAFT ({draft.upper()}) ---")
+    output_filename = os.path.join(run_folder(run_id), f"draft_{run_id}.mp4")
+    music_path, video_path = run_media(run_id)
+    return generate_video_with_music(content['part1'], content['part2'], output_filename, draft=draft,
+                                     music_path=music_path, video_path=video_path)
+
+def video_metadata(content: dict) -> tuple[str, list]:
+    """Builds the YouTube description and a robust set of tags for the generated content."""
+    part1, part2, title = content['part1'], content['part2'], content['title']
+    description = f"""{part1} {part2}\n\n#shorts #ytshorts #spiritual #spiritualfacts #Quickfeelfacts #spirituality #spiritualawakening #spiritualgrowth #mindfulness #meditation #selfimprovement #wisdom #enlightenment\n\n"""
+    base_tags = ["spiritual", "facts", "shorts","ytshorts", "spirituality", "spiritualawakening", "spiritualgrowth", "mindfulness", "meditation", "selfimprovement", "wisdom", "enlightenment"]
+    ai_tags = generate_extra_tags(title, f"{part1} {part2}")
+    return description, list(set(base_tags + ai_tags)) # Combine and remove duplicates
+
+def stage_upload_video(run_id: str, content: dict, render: dict, privacy_status: str = "public",
+                       publish_at: str = None) -> dict:
+    """
+    STAGE 3: Uploads the rendered video to YouTube (skipped if it already has a video ID).
+    An upload session a streaming upload checkpointed before completing it is resumed instead
+    of starting a new one, so a crash at the wrong moment can't publish the video twice.
+    """
+    print("\n--- STAGE 3: UPLOADING TO YOUTUBE ---")
+    upload = load_checkpoint(run_id, 'upload')
+    if upload and upload.get('sha256') == render['sha256']:
+        if upload.get('video_id'):
+            print(f"⏭️ Video from run {run_id} is already on YouTube with ID: {upload['video_id']}")
+            return upload
+        if upload.get('session_uri'):
+            try:
+                video_id = resume_upload(youtube_session(), upload['session_uri'], render['video'])['id']
+                print(f"✅ Resumed the upload session, video ID: {video_id}")
+                return save_upload(run_id, render, video_id, upload.get('publish_at'))
+            except Exception as e:
+                expired = isinstance(e, requests.HTTPError) and getattr(e.response, 'status_code', None) in (404, 410)
+                if not expired:
+                    # The video may already be published: retry this session later, never start a second upload
+                    print(f"❌ ERROR: Could not resume the upload session. Details: {e}")
+                    return {'video_id': None, 'status': f"YouTube Upload Failed: {e}"}
+                print("⚠️ The checkpointed upload session has expired, uploading the video again.")
+
+    title = content['title']
+    try:
+        youtube = get_youtube_service()
+        print("✅ YouTube Authentication Successful.")
+
+        description, final_tags = video_metadata(content)
+
+        print(f"🚀 Uploading '{render['video']}' to YouTube...")
+        # Call the function from upload_video.py
+        video_id = upload_video(
+            youtube,
+            file_path=render['video'],
+            title=title,
+            description=description,
+            tags=final_tags,
+            privacy_status=privacy_status,
+            publish_at=publish_at
+        )
+        if not video_id:
+            raise Exception("Upload failed, video ID not received.")
+    except Exception as e:
+        print(f"❌ ERROR: YouTube upload failed. Details: {e}")
+        # Not checkpointed, so re-running this run ID retries the upload only
+        return {'video_id': None, 'status': f"YouTube Upload Failed: {e}"}
+
+    upload = save_upload(run_id, render, video_id, publish_at)
+    print("✅ Video Uploaded Successfully!")
+    return upload
+
+def save_upload(run_id: str, render: dict, video_id: str, publish_at: str = None) -> dict:
+    """Checkpoints a finished upload."""
+    status = f"Scheduled on YouTube for {publish_at}" if publish_at else "Uploaded to YouTube"
+    upload = {'video_id': video_id, 'sha256': render['sha256'], 'status': status, 'publish_at': publish_at}
+    save_checkpoint(run_id, 'upload', upload)
+    return upload
+
+def set_aside_invalid(video_path: str) -> str:
+    """Renames a render that failed validation, so it's kept for a look but never reused or uploaded."""
+    rejected = os.path.splitext(video_path)[0] + '.invalid.mp4'
+    os.replace(video_path, rejected)
+    print(f"⚠️ Moved the broken video to {rejected}; re-running this run ID renders it again.")
+    return rejected
+
+def stage_validate_and_upload(run_id: str, content: dict, render: dict, privacy_status: str = "public",
+                              publish_at: str = None) -> dict:
+    """STAGE 3: Uploads the render only if it passed validation (checked now if its checkpoint predates that)."""
+    upload = load_checkpoint(run_id, 'upload')
+    if not (upload and upload.get('sha256') == render['sha256']):  # Else this exact file is (being) uploaded
+        problems = render.get('problems')
+        if problems is None:
+            print("\n--- CHECKING THE VIDEO BEFORE UPLOAD ---")
+            problems = validate_video(render['video'])
+        if problems:
+            set_aside_invalid(render['video'])
+            return {'video_id': None, 'status': f"Validation Failed: {'; '.join(problems)}"}
+    return stage_upload_video(run_id, content, render, privacy_status, publish_at)
+
+def stage_render_and_stream_upload(run_id: str, content: dict, encode_profile: str = DEFAULT_PROFILE,
+                                   privacy_status: str = "public", publish_at: str = None) -> tuple[dict, dict]:
+    """
+    STAGES 2+3: Renders a fragmented MP4 and uploads it to YouTube WHILE it's being encoded,
+    so the upload finishes moments after the encoder instead of starting then. Both stages are
+    checkpointed as usual. If the streaming upload fails, the finished file is uploaded normally.
+    The finished file is validated before the upload is completed; if it fails, the upload
+    session is abandoned unfinished and YouTube discards it.
+    """
+    if verified_render(load_checkpoint(run_id, 'render')):
+        # Rendered by an earlier attempt: only the (plain) upload is left to do
+        render = stage_render_video(run_id, content, encode_profile)
+        return render, stage_validate_and_upload(run_id, content, render, privacy_status, publish_at)
+
+    print("\n--- STAGES 2+3: GENERATING VIDEO AND UPLOADING IT WHILE IT ENCODES ---")
+    output_filename = os.path.join(run_folder(run_id), f"quote_{run_id}.mp4")
+    if os.path.exists(output_filename):
+        os.remove(output_filename)  # The uploader must only ever see bytes from this render
+    music_path, video_path = run_media(run_id)
+    errors, problems, finished = [], [], threading.Event()
+
+    def render_video():
+        try:
+            generate_video_with_music(content['part1'], content['part2'], output_filename,
+                                      encode_profile=encode_profile, fragmented=True,
+                                      music_path=music_path, video_path=video_path)
+            problems.extend(validate_video(output_filename))  # Before 'done': a broken video is never finalized
+        except Exception as e:
+            errors.append(e)
+        finally:
+            finished.set()
+
+    def encoder_state() -> str:
+        return 'failed' if errors or problems else 'done' if finished.is_set() else 'running'
+
+    rendered, session_uri = {}, None
+
+    def checkpoint_session():
+        # The file is final and valid. It and the upload session are checkpointed before the chunk
+        # that completes (publishes) the upload: a run that dies after that resumes the session
+        # in stage_upload_video instead of uploading the video a second time.
+        rendered.update({'video': output_filename, 'sha256': file_sha256(output_filename),
+                         'encode_profile': encode_profile, 'size_bytes': os.path.getsize(output_filename),
+                         'fragmented': True, 'problems': problems})
+        save_checkpoint(run_id, 'render', rendered)
+        save_checkpoint(run_id, 'upload', {'video_id': None, 'session_uri': session_uri, 'sha256': rendered['sha256'],
+                                           'status': "Upload in progress", 'publish_at': publish_at})
+
+    render_thread = threading.Thread(target=render_video, name='render', daemon=True)
+    render_thread.start()
+    video_id = None
+    try:
+        description, tags = video_metadata(content)
+        body = video_body(content['title'], description, tags, privacy_status, publish_at)
+        session = youtube_session()
+        session_uri = start_session(session, body)
+        video_id = upload_growing_file(session, session_uri, output_filename, encoder_state,
+                                       before_complete=checkpoint_session)['id']
+    except Exception as e:
+        if not errors and not problems:
+            print(f"⚠️ Streaming upload failed, the video will be uploaded once it's rendered. Error: {e}")
+    render_thread.join()
+    if errors:
+        raise errors[0]
+    if problems:
+        render = {'video': set_aside_invalid(output_filename), 'encode_profile': encode_profile, 'fragmented': True}
+        return render, {'video_id': None, 'status': f"Validation Failed: {'; '.join(problems)}"}
+
+    render = rendered
+    if not render:  # The streaming upload failed before the file was final
+        render = {'video': output_filename, 'sha256': file_sha256(output_filename), 'encode_profile': encode_profile,
+                  'size_bytes': os.path.getsize(output_filename), 'fragmented': True, 'problems': problems}
+        save_checkpoint(run_id, 'render', render)
+    if not video_id:
+        # Resumes the checkpointed session if there is one, else uploads the file normally
+        return render, stage_validate_and_upload(run_id, content, render, privacy_status, publish_at)
+
+    upload = save_upload(run_id, render, video_id, publish_at)
+    print(f"✅ Video Uploaded Successfully while encoding! ID: {video_id}")
+    return render, upload
+
+def stage_log_to_sheet(run_id: str, content: dict, render: dict, upload_status: str):
+    """STAGE 4: Logs the run to Google Sheets (skipped if this exact status was already logged)."""
+    print("\n--- STAGE 4: LOGGING TO GOOGLE SHEETS ---")
+    logged = load_checkpoint(run_id, 'log')
+    if logged and logged.get('status') == upload_status:
+        print(f"⏭️ Run {run_id} was already logged with status '{upload_status}'.")
+        return
+    if log_to_sheet(content['part1'], content['part2'], content['title'],
+                    os.path.basename(render['video']), upload_status):
+        save_checkpoint(run_id, 'log', {'status': upload_status})
+
+def run_pipeline(choice: str, run_id: str, privacy_status: str = "public",
+                 encode_profile: str = DEFAULT_PROFILE, publish_at: str = None, draft: str = None,
+                 stream_upload: bool = False) -> dict:
+    """
+    Runs (or resumes) all stages of one video for the given run ID and returns a summary.
+    With publish_at, the video is uploaded privately and YouTube publishes it at that time.
+    With draft ('video' or 'sheet'), only a preview is rendered: nothing is uploaded or logged,
+    and re-running the same run ID without draft renders the final video from the same content.
+    With stream_upload (and choice '2'), the upload runs while the video is still encoding.
+    """
+    print(f"🆔 Run ID: {run_id} (re-run with --run-id {run_id} to resume)")
+    content = stage_generate_content(run_id)
+    if draft:
+        preview = stage_render_draft(run_id, content, draft)
+        return {'run_id': run_id, 'video': preview, 'video_id': None, 'status': "Draft"}
+    if choice == '2' and stream_upload:
+        render, upload = stage_render_and_stream_upload(run_id, content, encode_profile, privacy_status, publish_at)
+    else:
+        render = stage_render_video(run_id, content, encode_profile)
+        upload = {'video_id': None, 'status': "Generated Locally"} # Default status for logging
+        if choice == '2':
+            upload = stage_validate_and_upload(run_id, content, render, privacy_status, publish_at)
+
+    stage_log_to_sheet(run_id, content, render, upload['status'])
+    return {'run_id': run_id, 'video': render['video'], 'video_id': upload['video_id'], 'status': upload['status']}
+
+# --- BULK PRE-GENERATION ---
+# One runner setup (apt, pip, assets, auth) can produce a week of videos. Each one is
+# uploaded privately with a publishAt time, so the channel still gets one video per slot.
+
+def publish_schedule(count: int, interval_hours: float = 24, first_slot: datetime = None) -> list[str]:
+    """
+    Returns `count` RFC 3339 publish times, `interval_hours` apart. By default the first slot
+    is the next PUBLISH_TIME_UTC that is at least MIN_SCHEDULE_LEAD_MINUTES away.
+    """
+    if first_slot is None:
+        hour, minute = map(int, PUBLISH_TIME_UTC.split(':'))
+        earliest = datetime.now(timezone.utc) + timedelta(minutes=MIN_SCHEDULE_LEAD_MINUTES)
+        first_slot = earliest.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if first_slot < earliest:
+            first_slot += timedelta(days=1)
+    elif first_slot.tzinfo is None:
+        first_slot = first_slot.replace(tzinfo=timezone.utc)
+    return [(first_slot + timedelta(hours=interval_hours * i)).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            for i in range(count)]
+
+def batch_schedule(batch_id: str, count: int, interval_hours: float = 24, first_slot: datetime = None) -> list[str]:
+    """
+    The publish times of a batch, computed on its first run and checkpointed in runs/<batch_id>/,
+    so resuming the batch keeps every video on its original slot. A batch resumed with a larger
+    count gets the extra slots after its last one.
+    """
+    schedule = load_checkpoint(batch_id, 'schedule')
+    if not schedule:
+        slots = publish_schedule(count, interval_hours, first_slot)
+    else:
+        slots = schedule['slots']
+        if len(slots) < count:
+            after_last = datetime.strptime(slots[-1], '%Y-%m-%dT%H:%M:%SZ') + timedelta(hours=interval_hours)
+            slots = slots + publish_schedule(count - len(slots), interval_hours, after_last)
+        if first_slot is not None:
+            print(f"⚠️ Batch {batch_id} is already scheduled from {slots[0]}; --first-publish is ignored.")
+    if not schedule or len(schedule['slots']) < len(slots):
+        save_checkpoint(batch_id, 'schedule', {'slots': slots, 'interval_hours': interval_hours})
+    return slots[:count]
+
+def run_batch(choice: str, batch_id: str, count: int, interval_hours: float = 24, first_slot: datetime = None,
+              encode_profile: str = DEFAULT_PROFILE, stream_upload: bool = False) -> list[dict]:
+    """
+    Renders (and with choice '2' schedules) `count` videos in one go. Every video gets its
+    own run ID (<batch_id>-1, -2, ...), so a re-run of the batch resumes where it stopped
+    (with the same publish times), and one failed video doesn't stop the rest.
+    """
+    slots = batch_schedule(batch_id, count, interval_hours, first_slot)
+    print(f"📅 Batch {batch_id}: {count} videos, publishing {slots[0]} to {slots[-1]}")
+    stage_generate_content_batch([f"{batch_id}-{i + 1}" for i in range(count)])
+    summaries = []
+    for i, publish_at in enumerate(slots):
+        run_id = f"{batch_id}-{i + 1}"
+        print(f"\n🎞️ --- Video {i + 1}/{count} (publishes {publish_at}) ---")
+        try:
+            summaries.append(run_pipeline(choice, run_id, privacy_status="private",
+                                          encode_profile=encode_profile, publish_at=publish_at,
+                                          stream_upload=stream_upload))
+        except (Exception, SystemExit) as e:  # A halted stage calls exit(); keep going with the next video
+            print(f"❌ Video {i + 1} of the batch failed. Re-run with --run-id {batch_id} to retry it. Details: {e}")
+            summaries.append({'run_id': run_id, 'video': None, 'video_id': None, 'status': f"Failed: {e}"})
+
+    scheduled = sum(1 for summary in summaries if summary['video_id'])
+    print(f"\n📅 Batch {batch_id} finished: {scheduled}/{count} videos scheduled.")
+    for summary, publish_at in zip(summaries, slots):
+        print(f"   {publish_at}  {summary['video_id'] or '-':<12} {summary['status']}")
+    return summaries
 
 # --- MAIN EXECUTION BLOCK ---
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI YouTube Shorts Factory")
+    parser.add_argument('--run-id', help="Resume (or start) the run with this ID; completed stages are skipped.")
+    parser.add_argument('--encode-profile', default=os.getenv('ENCODE_PROFILE', DEFAULT_PROFILE),
+                        choices=sorted(ENCODE_PROFILES), help="Named encoder settings (see encode_profiles.py).")
+    parser.add_argument('--batch', type=int, default=1,
+                        help="Pre-generate this many videos and schedule them with publishAt, one per interval.")
+    parser.add_argument('--interval-hours', type=float, default=24, help="Hours between scheduled videos in a batch.")
+    parser.add_argument('--first-publish', type=datetime.fromisoformat,
+                        help=f"UTC time of the first scheduled video, e.g. 2025-07-01T06:30 "
+                             f"(default: the next {PUBLISH_TIME_UTC} UTC).")
+    parser.add_argument('--draft', choices=['video', 'sheet'],
+                        help="Quick local preview: a half-size 12 fps video, or a contact sheet of the key frames. "
+                             "Never uploaded.")
+    parser.add_argument('--stream-upload', action='store_true', default=os.getenv('STREAM_UPLOAD') == '1',
+                        help="Upload to YouTube while the video is still encoding (fragmented MP4).")
+    args = parser.parse_args()
+
     print("\n🚀 --- AI YouTube Shorts Factory ---")
 
     # Setup environment for GitHub Actions or local use
@@ -304,61 +583,31 @@ if __name__ == "__main__":
     if not verify_media_files():
         exit("❌ Cannot proceed without media files. Halting execution.")
 
+    # Font metrics load here while the API handshakes finish in the background
+    try:
+        glyph_metrics(FONT_PATH)
+    except Exception as e:
+        print(f"⚠️ Could not preload font metrics from {FONT_PATH}. Error: {e}")
+    report_clients()
+
     # Get user choice (automatically selects '2' for GitHub Actions)
     choice = get_user_choice()
 
-    if choice in ['1', '2']:
-        # --- STAGE 1: GENERATING CONTENT ---
-        print("\n--- STAGE 1: GENERATING CONTENT ---")
-        part1, part2, title = create_quote_content()
-        if part1 == "Error":
-            exit("❌ Failed to generate content from AI. Halting execution.")
-        print(f"✅ Content Generated: {title}")
-
-        # --- STAGE 2: GENERATING VIDEO ---
-        print("\n--- STAGE 2: GENERATING VIDEO ---")
-        # Create a unique filename to prevent conflicts
-        timestamp = int(time.time())
-        output_filename = f"quote_{timestamp}.mp4"
-        
-        # Call the function to create the .mp4 file
-        generate_video_with_music(part1, part2, output_filename)
-
-        # --- STAGE 3: UPLOADING TO YOUTUBE (if choice is '2') ---
-        upload_status = "Generated Locally" # Default status for logging
+    if choice in ['1', '2'] and args.draft:
         if choice == '2':
-            print("\n--- STAGE 3: UPLOADING TO YOUTUBE ---")
-            try:
-                youtube = get_authenticated_service()
-                print("✅ YouTube Authentication Successful.")
-
-                # Create description and a robust set of tags
-                description = f"""{part1} {part2}\n\n#shorts #ytshorts #spiritual #spiritualfacts #Quickfeelfacts #spirituality #spiritualawakening #spiritualgrowth #mindfulness #meditation #selfimprovement #wisdom #enlightenment\n\n"""
-                base_tags = ["spiritual", "facts", "shorts","ytshorts", "spirituality", "spiritualawakening", "spiritualgrowth", "mindfulness", "meditation", "selfimprovement", "wisdom", "enlightenment"]
-                ai_tags = generate_extra_tags(title, f"{part1} {part2}")
-                final_tags = list(set(base_tags + ai_tags)) # Combine and remove duplicates
-
-                print(f"🚀 Uploading '{output_filename}' to YouTube...")
-                # Call the function from upload_video.py
-                upload_video(
-                    youtube,
-                    file_path=output_filename,
-                    title=title,
-                    description=description,
-                    tags=final_tags,
-                    privacy_status="public"
-                )
-                upload_status = "Uploaded to YouTube"
-                print("✅ Video Uploaded Successfully!")
-
-            except Exception as e:
-                print(f"❌ ERROR: YouTube upload failed. Details: {e}")
-                upload_status = f"YouTube Upload Failed: {e}"
-
-        # --- STAGE 4: LOGGING TO GOOGLE SHEETS ---
-        print("\n--- STAGE 4: LOGGING TO GOOGLE SHEETS ---")
-        log_to_sheet(part1, part2, title, output_filename, upload_status)
+            print("⚠️ Drafts are never uploaded; rendering the preview only.")
+        summary = run_pipeline('1', args.run_id or new_run_id(), draft=args.draft)
+        print(f"\n✅ --- Draft ready: {summary['video']} (re-run with --run-id {summary['run_id']} "
+              f"and without --draft for the final video) ---")
+
+    elif choice in ['1', '2'] and args.batch > 1:
+        run_batch(choice, args.run_id or new_run_id(), args.batch, args.interval_hours, args.first_publish,
+                  encode_profile=args.encode_profile, stream_upload=args.stream_upload)
+        print("\n✅ --- All tasks completed. ---")
 
+    elif choice in ['1', '2']:
+        run_pipeline(choice, args.run_id or new_run_id(), encode_profile=args.encode_profile,
+                     stream_upload=args.stream_upload)
         print("\n✅ --- All tasks completed. ---")
 
     else:
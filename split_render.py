@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from moviepy.config import get_setting
+from compositor import share_memory_budget, shared_memory_budget
+from encode_profiles import DEFAULT_PROFILE
+from video_renderer import FPS, SPLIT_SEGMENT_SECONDS, VIDEO_DURATION, generate_video_variants, prepare_music
+
+# Most of a render (decode, zoom, composite) is single-threaded Python, so one video only
+# keeps one core busy. Here the timeline is cut into segments that are composited and
+# encoded in separate processes. Every segment is its own encode, so it starts on a keyframe
+# (GOP-aligned by construction) and the segments can be joined with ffmpeg's concat demuxer
+# by stream copy, no re-encode. The music is muxed once, during the join.
+
+
+def segment_ranges(duration: float = VIDEO_DURATION, fps: float = FPS,
+                   segment_seconds: float = SPLIT_SEGMENT_SECONDS) -> list[tuple[int, int]]:
+    """
+    Cuts the timeline into (first, end) output frame ranges of segment_seconds each (the last
+    one may be shorter). The default 2-second segments keep up to six processes busy; 6-second
+    segments would split the video into its part1 and part2 halves instead.
+    """
+    frame_count = int(round(duration * fps))
+    frames_per_segment = max(int(round(segment_seconds * fps)), 1)
+    return [(first, min(first + frames_per_segment, frame_count)) for first in range(0, frame_count, frames_per_segment)]
+
+
+def _render_segment(variant: dict, segment_path: str, music_path: str, video_path: str, encode_profile: str,
+                    frame_range: tuple) -> str:
+    generate_video_variants([variant], [segment_path], music_path, video_path, encode_profile=encode_profile,
+                            frame_range=frame_range)
+    return segment_path
+
+
+def concat_segments(segment_paths: list[str], audio_path: str, output_filename: str):
+    """Joins silent segments losslessly with the concat demuxer and muxes the music in the same pass."""
+    list_path = os.path.join(os.path.dirname(segment_paths[0]), 'segments.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [get_setting("FFMPEG_BINARY"), '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+           '-i', audio_path, '-map', '0:v', '-map', '1:a', '-c', 'copy', output_filename]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise IOError(f"Joining the segments into {output_filename} failed: {result.stderr.strip()}")
+
+
+def split_render(variant: dict, output_filename: str, music_path: str, video_path: str,
+                 encode_profile: str = DEFAULT_PROFILE, workers: int = None,
+                 segment_seconds: float = SPLIT_SEGMENT_SECONDS) -> str:
+    """
+    Renders one video as parallel segments and joins them. Wall time scales with the number
+    of workers (default: one per CPU), up to one per segment.
+
+    Returns:
+        str: output_filename.
+    """
+    ranges = segment_ranges(segment_seconds=segment_seconds)
+    workers = min(workers or os.cpu_count() or 1, len(ranges))
+    print(f"🧩 Split render: {len(ranges)} segments of {segment_seconds:g}s on {workers} processes")
+    segment_folder = tempfile.mkdtemp(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_filename)))
+    audio_path, audio_is_temporary = prepare_music(music_path)
+    try:
+        segment_paths = [os.path.join(segment_folder, f"segment_{i:03d}.mp4") for i in range(len(ranges))]
+        context = multiprocessing.get_context('spawn')
+        # The segment processes reserve their memory from one shared ceiling: the one this process
+        # already draws from (e.g. as a render_daemon worker), or a new one for a standalone render
+        budget = shared_memory_budget() or (context.Condition(), context.Value('q', 0))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=share_memory_budget,
+                                 initargs=budget) as pool:
+            futures = [pool.submit(_render_segment, variant, path, music_path, video_path, encode_profile, frame_range)
+                       for path, frame_range in zip(segment_paths, ranges)]
+            for future in futures:
+                future.result()
+        concat_segments(segment_paths, audio_path, output_filename)
+    finally:
+        shutil.rmtree(segment_folder, ignore_errors=True)
+        if audio_is_temporary:
+            os.remove(audio_path)
+    print(f"✅ Video saved successfully as {output_filename} (joined from {len(ranges)} segments)")
+    return output_filename
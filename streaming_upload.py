@@ -0,0 +1,171 @@
+import os
+import time
+import requests
+
+# Uploads a video to YouTube while it is still being encoded. The encoder writes a
+# fragmented MP4 (see encode_profiles.FRAGMENTED_MP4_PARAMS), which only ever appends
+# to the file, so every byte on disk is final and can go up in a resumable session
+# right away. When the encoder finishes, the last chunk closes the session.
+RESUMABLE_UPLOAD_URL = 'https://www.googleapis.com/upload/youtube/v3/videos'
+CHUNK_GRANULARITY = 256 * 1024  # Every chunk but the last must be a multiple of 256 KiB
+UPLOAD_CHUNK_BYTES = 8 * CHUNK_GRANULARITY
+POLL_SECONDS = 0.5
+MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 1.0  # Doubles with every retry of the same chunk
+
+
+def start_session(session, body: dict, upload_url: str = RESUMABLE_UPLOAD_URL, content_type: str = 'video/mp4') -> str:
+    """
+    Opens a resumable upload session for a video whose final size isn't known yet.
+
+    Args:
+        session: a requests.Session, e.g. google.auth.transport.requests.AuthorizedSession.
+        body (dict): the video resource ('snippet', 'status'), as for videos().insert.
+
+    Returns:
+        str: the session URI that the chunks are PUT to.
+    """
+    response = session.post(upload_url, params={'uploadType': 'resumable', 'part': ','.join(body.keys())},
+                            json=body, headers={'X-Upload-Content-Type': content_type})
+    response.raise_for_status()
+    return response.headers['Location']
+
+
+def _confirmed_offset(response) -> int:
+    """Bytes the server has persisted, from the Range header of a 308 response ('bytes=0-N')."""
+    byte_range = response.headers.get('Range')
+    return int(byte_range.split('-')[1]) + 1 if byte_range else 0
+
+
+def query_offset(session, session_uri: str):
+    """Asks the server how far the upload got. Returns the offset, or the finished response if it's complete."""
+    response = session.put(session_uri, headers={'Content-Range': 'bytes */*', 'Content-Length': '0'})
+    if response.status_code in (200, 201):
+        return response
+    if response.status_code != 308:
+        response.raise_for_status()
+    return _confirmed_offset(response)
+
+
+def _send(session, session_uri: str, f, offset: int, length: int, total: int = None):
+    """
+    PUTs `length` bytes starting at `offset`, retrying with the server's own offset after
+    network errors or 5xx responses.
+
+    Returns:
+        (new_offset, finished_response or None)
+    """
+    resync = False
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            if resync:
+                # The server may have stored part (or all) of the chunk before failing
+                status = query_offset(session, session_uri)
+                if not isinstance(status, int):
+                    return offset + length, status
+                length -= status - offset
+                offset = status
+                resync = False
+            f.seek(offset)
+            data = f.read(length)
+            size = '*' if total is None else str(total)
+            content_range = f"bytes {offset}-{offset + len(data) - 1}/{size}" if data else f"bytes */{size}"
+            response = session.put(session_uri, data=data, headers={'Content-Range': content_range})
+            if response.status_code in (200, 201):
+                return offset + len(data), response
+            if response.status_code == 308:
+                return _confirmed_offset(response), None
+            if response.status_code < 500:
+                response.raise_for_status()
+            error = f"HTTP {response.status_code}"
+        except requests.HTTPError as e:  # Only the offset query raises for a 5xx; 4xx are final
+            if e.response is None or e.response.status_code < 500:
+                raise
+            error = f"HTTP {e.response.status_code}"
+        except requests.ConnectionError as e:
+            error = str(e)
+        resync = True
+        if attempt == MAX_RETRIES:
+            break
+        backoff = RETRY_BACKOFF_SECONDS * 2 ** attempt
+        print(f"  ⚠️ Chunk at byte {offset} failed ({error}), resuming in {backoff:g}s...")
+        time.sleep(backoff)
+    raise IOError(f"Upload chunk at byte {offset} failed after {MAX_RETRIES} retries: {error}")
+
+
+def _complete(session, session_uri: str, f, offset: int, size: int, chunk_bytes: int):
+    """Sends the rest of a file whose final size is known; the very last chunk carries the total and closes the session."""
+    while size - offset > chunk_bytes:
+        offset, _ = _send(session, session_uri, f, offset, chunk_bytes)
+    offset, finished = _send(session, session_uri, f, offset, size - offset, total=size)
+    if finished is None:
+        raise IOError(f"The server did not complete the upload at {offset}/{size} bytes.")
+    return finished
+
+
+def upload_growing_file(session, session_uri: str, path: str, encoder_state, chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+                        poll_seconds: float = POLL_SECONDS, before_complete=None) -> dict:
+    """
+    Follows a file that an encoder is still appending to and uploads it in final chunks.
+
+    Args:
+        encoder_state: callable returning 'running', 'done' or 'failed'. Once it says 'done'
+            the file size is taken as final and the session is completed.
+        before_complete: optional callable, run once the file is final and before the chunk
+            that completes the session, e.g. to checkpoint the session for resume_upload().
+
+    Returns:
+        dict: the server's JSON response for the finished upload (the video resource).
+    """
+    if chunk_bytes % CHUNK_GRANULARITY:
+        raise ValueError(f"chunk_bytes must be a multiple of {CHUNK_GRANULARITY}")
+    offset = 0
+    while not os.path.exists(path):
+        if encoder_state() == 'failed':
+            raise IOError("The encoder failed before writing anything, upload abandoned.")
+        time.sleep(poll_seconds)
+
+    with open(path, 'rb') as f:
+        while True:
+            state = encoder_state()  # Read before the size: a 'done' size is then guaranteed final
+            if state == 'failed':
+                raise IOError("The encoder failed, upload abandoned.")
+            size = os.path.getsize(path)
+
+            if state == 'done':
+                if before_complete:
+                    before_complete()
+                finished = _complete(session, session_uri, f, offset, size, chunk_bytes)
+                print(f"  Uploaded {size // 1024} KB while encoding.")
+                return finished.json()
+
+            if size - offset >= chunk_bytes:
+                sendable = (size - offset) // chunk_bytes * chunk_bytes
+                offset, _ = _send(session, session_uri, f, offset, sendable)
+                print(f"  Uploaded {offset // 1024} KB (encoder at {size // 1024} KB)")
+            else:
+                time.sleep(poll_seconds)
+
+
+def resume_upload(session, session_uri: str, path: str, chunk_bytes: int = UPLOAD_CHUNK_BYTES) -> dict:
+    """
+    Finishes an interrupted upload of a complete file in the session it was started in,
+    from where the server says it got to. If the session had already been completed, no
+    bytes are sent. Raises requests.HTTPError (404/410) if the session has expired.
+
+    Returns:
+        dict: the server's JSON response for the finished upload (the video resource).
+    """
+    status = query_offset(session, session_uri)
+    if not isinstance(status, int):
+        return status.json()
+    print(f"  Resuming the upload session at byte {status}...")
+    with open(path, 'rb') as f:
+        return _complete(session, session_uri, f, status, os.path.getsize(path), chunk_bytes).json()
+
+
+def youtube_session():
+    """An authorized requests session for the YouTube upload endpoint, from the saved token."""
+    from google.auth.transport.requests import AuthorizedSession
+    from upload_video import get_credentials
+    return AuthorizedSession(get_credentials())
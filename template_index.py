@@ -0,0 +1,168 @@
+import os
+import subprocess
+import numpy as np
+from moviepy.config import get_setting
+from media_index import MEDIA_INDEX_FILE, load_media_index, save_media_index
+
+# Templates are analysed on a small grid with the same aspect ratio as the final 1080x1920 frame.
+ANALYSIS_WIDTH = 108
+ANALYSIS_HEIGHT = 192
+SAMPLE_FPS = 1                 # One sampled frame per second is enough to see brightness and motion
+MAP_ROWS, MAP_COLS = 16, 9     # Resolution of the stored luminance/motion maps
+
+# Regions as (top, bottom, left, right) fractions of the frame.
+HEADING_REGION = (0.20, 0.20 + 110 / 1920, 0.15, 0.85)
+CAPTION_REGIONS = {
+    'center': (0.40, 0.60, 0.05, 0.95),
+    'upper': (0.30, 0.50, 0.05, 0.95),
+    'lower': (0.58, 0.78, 0.05, 0.95),
+}
+# Vertical center of each caption candidate, used to place the TextClip.
+CAPTION_CENTERS = {name: (top + bottom) / 2 for name, (top, bottom, _, _) in CAPTION_REGIONS.items()}
+
+# 'center' is the house style, another region has to be clearly better to win.
+CENTER_PREFERENCE = 0.08
+MOTION_WEIGHT = 2.0
+
+DEFAULT_CAPTION_STYLE = {'position': 'center', 'stroke_width': 3, 'shadow_opacity': 0.0}
+
+
+def sample_template_frames(video_path: str, duration: float) -> np.ndarray:
+    """Decodes SAMPLE_FPS frames per second, scaled and center-cropped like the final render."""
+    vf = (f"fps={SAMPLE_FPS},scale=-2:{ANALYSIS_HEIGHT},"
+          f"crop={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT}")
+    cmd = [get_setting("FFMPEG_BINARY"), '-v', 'error', '-t', str(duration), '-i', video_path,
+           '-vf', vf, '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    frame_size = ANALYSIS_WIDTH * ANALYSIS_HEIGHT * 3
+    n_frames = len(result.stdout) // frame_size
+    if n_frames == 0:
+        raise ValueError(f"No frames could be decoded from '{video_path}'")
+    frames = np.frombuffer(result.stdout[:n_frames * frame_size], dtype=np.uint8)
+    return frames.reshape(n_frames, ANALYSIS_HEIGHT, ANALYSIS_WIDTH, 3)
+
+
+def luminance_and_motion(frames: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes per-pixel maps over all sampled frames in one vectorized pass.
+
+    Returns:
+        (mean_luma, p90_luma, motion): float32 maps in [0, 1] of shape (height, width).
+    """
+    luma = frames.astype(np.float32) @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32) / 255.0
+    mean_luma = luma.mean(axis=0)
+    p90_luma = np.percentile(luma, 90, axis=0).astype(np.float32)
+    if len(luma) > 1:
+        motion = np.abs(np.diff(luma, axis=0)).mean(axis=0)
+    else:
+        motion = np.zeros_like(mean_luma)
+    return mean_luma, p90_luma, motion
+
+
+def region_stats(mean_luma: np.ndarray, p90_luma: np.ndarray, motion: np.ndarray, region: tuple) -> dict:
+    """Summarizes the maps inside one (top, bottom, left, right) region."""
+    height, width = mean_luma.shape
+    top, bottom, left, right = region
+    rows = slice(int(top * height), max(int(bottom * height), int(top * height) + 1))
+    cols = slice(int(left * width), max(int(right * width), int(left * width) + 1))
+    return {
+        'luma_mean': round(float(mean_luma[rows, cols].mean()), 4),
+        'luma_p90': round(float(p90_luma[rows, cols].mean()), 4),
+        'motion': round(float(motion[rows, cols].mean()), 4),
+    }
+
+
+def downsample_map(values: np.ndarray) -> list:
+    """Block-averages a map down to MAP_ROWS x MAP_COLS so it stays small in the JSON index."""
+    height, width = values.shape
+    rows, cols = height // MAP_ROWS, width // MAP_COLS
+    blocks = values[:rows * MAP_ROWS, :cols * MAP_COLS].reshape(MAP_ROWS, rows, MAP_COLS, cols)
+    return np.round(blocks.mean(axis=(1, 3)), 3).tolist()
+
+
+def caption_style_for(regions: dict) -> dict:
+    """Picks the most readable caption region for white text and the stroke/shadow it needs."""
+    def difficulty(stats):
+        # Bright and busy backgrounds are what make white text hard to read.
+        return 0.7 * stats['luma_p90'] + 0.3 * stats['luma_mean'] + MOTION_WEIGHT * stats['motion']
+
+    scores = {name: difficulty(regions[name]) for name in CAPTION_REGIONS}
+    scores['center'] -= CENTER_PREFERENCE
+    position = min(scores, key=scores.get)
+
+    brightness = regions[position]['luma_p90']
+    if brightness < 0.35:
+        stroke_width, shadow_opacity = 2, 0.0
+    elif brightness < 0.6:
+        stroke_width, shadow_opacity = 3, 0.0
+    elif brightness < 0.8:
+        stroke_width, shadow_opacity = 4, 0.4
+    else:
+        stroke_width, shadow_opacity = 5, 0.7
+    return {'position': position, 'stroke_width': stroke_width, 'shadow_opacity': shadow_opacity}
+
+
+def analyze_template(video_path: str, duration: float) -> dict:
+    """Analyses one background template and returns its index entry."""
+    frames = sample_template_frames(video_path, duration)
+    mean_luma, p90_luma, motion = luminance_and_motion(frames)
+
+    regions = {name: region_stats(mean_luma, p90_luma, motion, region) for name, region in CAPTION_REGIONS.items()}
+    regions['heading'] = region_stats(mean_luma, p90_luma, motion, HEADING_REGION)
+    return {
+        'size': os.path.getsize(video_path),
+        'sampled_frames': len(frames),
+        'regions': regions,
+        'luma_map': downsample_map(mean_luma),
+        'motion_map': downsample_map(motion),
+        'caption_style': caption_style_for(regions),
+    }
+
+
+def build_template_index(template_folder: str = 'spirit_temp', duration: float = 12,
+                         index_path: str = MEDIA_INDEX_FILE, force: bool = False) -> dict:
+    """Offline pass: analyses every .mp4 template and stores its contrast maps in the media index."""
+    index = load_media_index(index_path)
+    template_index = index.setdefault('templates', {})
+
+    for filename in sorted(f for f in os.listdir(template_folder) if f.endswith('.mp4')):
+        path = os.path.join(template_folder, filename)
+        key = path.replace(os.sep, '/')
+        entry = template_index.get(key)
+        if not force and entry and entry.get('size') == os.path.getsize(path):
+            print(f"  ⏭️ {key} already indexed ({entry['caption_style']}).")
+            continue
+        try:
+            template_index[key] = analyze_template(path, duration)
+            print(f"  ✅ {key}: {template_index[key]['caption_style']}")
+        except Exception as e:
+            print(f"  ⚠️ Could not analyse {key}, skipping. Error: {e}")
+
+    save_media_index(index, index_path)
+    return index
+
+
+def lookup_caption_style(video_path: str, index_path: str = MEDIA_INDEX_FILE) -> dict:
+    """
+    Looks up the precomputed caption style for a template. No frame analysis happens here.
+
+    Returns:
+        dict with 'position' (a key of CAPTION_CENTERS), 'stroke_width' and 'shadow_opacity'.
+        Falls back to DEFAULT_CAPTION_STYLE if the template isn't indexed or has changed.
+    """
+    entry = load_media_index(index_path).get('templates', {}).get(video_path.replace(os.sep, '/'))
+    if not entry:
+        print(f"⚠️ No contrast data indexed for '{video_path}', using the default caption style.")
+        return dict(DEFAULT_CAPTION_STYLE)
+    if os.path.exists(video_path) and os.path.getsize(video_path) != entry.get('size'):
+        print(f"⚠️ '{video_path}' changed since it was indexed, using the default caption style.")
+        return dict(DEFAULT_CAPTION_STYLE)
+    return dict(entry['caption_style'])
+
+
+# Run this file directly to (re)build the template section of the media index.
+if __name__ == '__main__':
+    import sys
+    print("--- Building template contrast index ---")
+    build_template_index(force='--force' in sys.argv)
+    print(f"✅ Media index written to {MEDIA_INDEX_FILE}")
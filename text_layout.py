@@ -0,0 +1,104 @@
+import string
+import functools
+from PIL import ImageFont
+
+# Glyph advances are measured ONCE per font at this size and scaled linearly to any other size,
+# so fitting a caption never has to rasterize anything.
+REFERENCE_SIZE = 200
+# Kerning and hinting aren't modelled, so keep a little slack on every line.
+WIDTH_SAFETY = 0.97
+LINE_SPACING = 1.0
+# Characters Gemini commonly produces beyond plain ASCII.
+EXTRA_GLYPHS = "…’‘“”—–•"
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(font_path: str):
+    return ImageFont.truetype(font_path, REFERENCE_SIZE)
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_metrics(font_path: str) -> dict:
+    """
+    Returns the cached metrics of a font, as fractions of the font size.
+
+    Returns:
+        dict with 'advances' (char -> advance width) and 'line_height'.
+    """
+    font = _load_font(font_path)
+    advances = {char: font.getlength(char) / REFERENCE_SIZE for char in string.printable + EXTRA_GLYPHS}
+    ascent, descent = font.getmetrics()
+    return {'advances': advances, 'line_height': (ascent + descent) / REFERENCE_SIZE}
+
+
+def text_width(text: str, font_path: str, font_size: float) -> float:
+    """Width of a single line of text in pixels at the given font size."""
+    advances = glyph_metrics(font_path)['advances']
+    total = 0.0
+    for char in text:
+        advance = advances.get(char)
+        if advance is None:
+            # Unseen glyph: measure it once and remember it in the table.
+            advance = advances[char] = _load_font(font_path).getlength(char) / REFERENCE_SIZE
+        total += advance
+    return total * font_size
+
+
+def wrap_lines(text: str, font_path: str, font_size: float, max_width: float) -> list[str]:
+    """Greedy word wrap. A single word wider than max_width gets a line of its own."""
+    space_width = text_width(' ', font_path, font_size)
+    lines, current, current_width = [], [], 0.0
+    for word in text.split():
+        word_width = text_width(word, font_path, font_size)
+        if current and current_width + space_width + word_width > max_width:
+            lines.append(' '.join(current))
+            current, current_width = [], 0.0
+        current_width += (space_width if current else 0) + word_width
+        current.append(word)
+    if current:
+        lines.append(' '.join(current))
+    return lines
+
+
+def layout_at_size(text: str, font_path: str, font_size: int, box_width: float, stroke_width: float = 0) -> dict:
+    """Lays the text out at one font size and returns its lines and bounding size."""
+    usable_width = box_width * WIDTH_SAFETY - 2 * stroke_width
+    lines = wrap_lines(text, font_path, font_size, usable_width)
+    widths = [text_width(line, font_path, font_size) for line in lines] or [0.0]
+    line_height = glyph_metrics(font_path)['line_height'] * font_size * LINE_SPACING
+    return {
+        'font_size': font_size,
+        'lines': lines,
+        'width': max(widths) + 2 * stroke_width,
+        'height': len(lines) * line_height + 2 * stroke_width,
+    }
+
+
+@functools.lru_cache(maxsize=1024)
+def fit_text(text: str, font_path: str, box_width: float, box_height: float, max_lines: int,
+             min_size: int = 40, max_size: int = 100, stroke_width: float = 0) -> dict:
+    """
+    Binary-searches the largest font size at which the text fits the box in at most max_lines lines.
+
+    Returns:
+        dict with 'font_size', 'lines', 'width', 'height' and 'fits'. If even min_size
+        doesn't fit, the min_size layout is returned with 'fits' set to False.
+    """
+    def fits(layout):
+        return (len(layout['lines']) <= max_lines and layout['width'] <= box_width
+                and layout['height'] <= box_height)
+
+    best = None
+    low, high = min_size, max_size
+    while low <= high:
+        size = (low + high) // 2
+        layout = layout_at_size(text, font_path, size, box_width, stroke_width)
+        if fits(layout):
+            best, low = layout, size + 1
+        else:
+            high = size - 1
+
+    if best is None:
+        best = layout_at_size(text, font_path, min_size, box_width, stroke_width)
+        return {**best, 'fits': False}
+    return {**best, 'fits': True}
@@ -0,0 +1,143 @@
+import os
+import json
+import random
+from file_lock import file_lock
+
+# Picks the theme for each Gemini attempt from run history instead of uniformly at random.
+# Themes that have yielded few facts are preferred, and themes whose recent attempts keep
+# coming back as duplicates are held back, so fewer attempts are wasted per new fact.
+THEME_HISTORY_FILE = 'theme_history.json'
+
+THEMES = [
+    "the nature of the true self vs. the physical body", "the concept of performing your duty (dharma)",
+    "the law of action and reaction (karma)", "detachment from the results of your work",
+    "the illusion of the material world", "how to control the senses and the mind",
+    "the eternal, unchanging nature of the soul", "finding peace in a chaotic world",
+    "the idea that change is the only constant", "the three fundamental energies of nature (gunas)"
+]
+
+RECENT_WINDOW = 20  # Attempts per theme that count towards its recent duplicate rate
+SATURATION_MIN_ATTEMPTS = 6
+SATURATION_DUPLICATE_RATE = 0.5  # A theme is saturated when half its recent attempts were duplicates
+SATURATED_WEIGHT = 0.1  # Saturated themes are still tried now and then, in case the model finds new angles
+
+
+def theme_history_lock(path: str = THEME_HISTORY_FILE):
+    """Hold this from load_theme_history() to save_theme_history(), so parallel runs don't lose attempts.
+    Runs don't hold it while talking to Gemini; they collect attempts and call save_attempts()."""
+    return file_lock(path)
+
+
+def load_theme_history(path: str = THEME_HISTORY_FILE) -> dict:
+    if not os.path.exists(path):
+        return {'themes': {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Could not read {path}, starting a fresh theme history. Error: {e}")
+        return {'themes': {}}
+
+
+def save_theme_history(history: dict, path: str = THEME_HISTORY_FILE):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def theme_stats(history: dict, theme: str) -> dict:
+    return history.setdefault('themes', {}).setdefault(theme, {'attempts': 0, 'facts': 0, 'duplicates': 0,
+                                                               'recent': []})
+
+
+def duplicate_rate(stats: dict) -> float:
+    """Share of the theme's recent attempts that produced a duplicate fact."""
+    recent = stats['recent']
+    return recent.count('duplicate') / len(recent) if recent else 0.0
+
+
+def is_saturated(stats: dict) -> bool:
+    return len(stats['recent']) >= SATURATION_MIN_ATTEMPTS and duplicate_rate(stats) >= SATURATION_DUPLICATE_RATE
+
+
+def theme_weight(stats: dict) -> float:
+    """Least-covered themes weigh most; the chance of a new fact (1 - duplicate rate) scales that down."""
+    # Laplace-smoothed, so one unlucky duplicate doesn't shut a barely-tried theme out
+    recent = stats['recent']
+    smoothed_rate = (recent.count('duplicate') + 1) / (len(recent) + 2)
+    weight = (1 - smoothed_rate) / (1 + stats['facts'])
+    if is_saturated(stats):
+        weight *= SATURATED_WEIGHT
+    return max(weight, 0.01)
+
+
+def choose_theme(history: dict, themes: list = THEMES, exclude: tuple = ()) -> str:
+    """Picks a theme by weighted least coverage, avoiding the ones already tried in this run if possible."""
+    candidates = [theme for theme in themes if theme not in exclude] or list(themes)
+    weights = [theme_weight(theme_stats(history, theme)) for theme in candidates]
+    return random.choices(candidates, weights=weights)[0]
+
+
+def _count_attempt(history: dict, theme: str, outcome: str) -> dict:
+    stats = theme_stats(history, theme)
+    stats['attempts'] += 1
+    if outcome == 'fact':
+        stats['facts'] += 1
+    elif outcome == 'duplicate':
+        stats['duplicates'] += 1
+    stats['recent'] = (stats['recent'] + [outcome])[-RECENT_WINDOW:]
+    return stats
+
+
+def record_attempt(history: dict, theme: str, outcome: str, attempts: list = None):
+    """
+    Records the outcome of one Gemini attempt for a theme.
+
+    Args:
+        outcome (str): 'fact' (new fact), 'duplicate' or 'error' (unparseable response).
+        attempts (list): if given, (theme, outcome) is also appended to it, for save_attempts().
+    """
+    if attempts is not None:
+        attempts.append((theme, outcome))
+    stats = _count_attempt(history, theme, outcome)
+    if outcome == 'duplicate' and is_saturated(stats):
+        print(f"⚠️ Theme '{theme}' looks saturated: {duplicate_rate(stats):.0%} of its last "
+              f"{len(stats['recent'])} attempts were duplicates. It will be picked less often.")
+
+
+def save_attempts(attempts: list, path: str = THEME_HISTORY_FILE):
+    """
+    Adds a run's (theme, outcome) attempts to the saved history. Runs pick themes from a copy
+    loaded without the lock and only hold it here, so parallel runs wait for each other for a
+    file write instead of for their Gemini round-trips.
+    """
+    if not attempts:
+        return
+    with theme_history_lock(path):
+        history = load_theme_history(path)
+        for theme, outcome in attempts:
+            _count_attempt(history, theme, outcome)
+        save_theme_history(history, path)
+
+
+def attempts_per_fact(history: dict) -> float:
+    """The expected number of Gemini attempts per new fact so far (lower is better)."""
+    themes = history.get('themes', {}).values()
+    facts = sum(stats['facts'] for stats in themes)
+    return sum(stats['attempts'] for stats in themes) / facts if facts else float('inf')
+
+
+def saturation_report(history: dict, themes: list = THEMES) -> str:
+    lines = [f"{'theme':<55} {'facts':>5} {'tries':>5} {'dup rate':>8}  status"]
+    for theme in sorted(themes, key=lambda theme: theme_stats(history, theme)['facts']):
+        stats = theme_stats(history, theme)
+        lines.append(f"{theme[:55]:<55} {stats['facts']:>5} {stats['attempts']:>5} {duplicate_rate(stats):>8.0%}  "
+                     f"{'SATURATED' if is_saturated(stats) else 'ok'}")
+    lines.append(f"Attempts per new fact: {attempts_per_fact(history):.2f}")
+    return '\n'.join(lines)
+
+
+# Run this file directly to see how each theme is doing.
+if __name__ == '__main__':
+    print(saturation_report(load_theme_history()))
@@ -22,8 +22,8 @@ API_SERVICE_NAME = 'youtube'
 API_VERSION = 'v3'
 CLIENT_SECRETS_FILE = 'client_secrets.json'
 
-def get_authenticated_service():
-    """Authenticates the user and returns an authorized YouTube service object."""
+def get_credentials():
+    """Loads (refreshing or re-authorizing if needed) the user's YouTube credentials."""
     credentials = None
     
     # Check if we have already stored the user's permission in token.pickle
@@ -50,9 +50,33 @@ def get_authenticated_service():
             pickle.dump(credentials, token)
             print(f"Credentials saved to {CREDENTIALS_PICKLE_FILE}")
             
-    return build(API_SERVICE_NAME, API_VERSION, credentials=credentials)
+    return credentials
+
+def get_authenticated_service():
+    """Authenticates the user and returns an authorized YouTube service object."""
+    return build(API_SERVICE_NAME, API_VERSION, credentials=get_credentials())
+
+def video_body(title, description, tags, privacy_status='public', publish_at=None):
+    """The video resource (snippet and status) sent with an upload."""
+    body = {
+        'snippet': {
+            'title': title,
+            'description': description,
+            'tags': tags,
+            'categoryId': '22'  # '22' is "People & Blogs", suitable for motivation
+        },
+        'status': {
+            'privacyStatus': privacy_status,
+            'selfDeclaredMadeForKids': False  # <--- ADDED: Sets 'Not Made for Kids'
+        }
+    }
+    if publish_at:
+        # YouTube only honours publishAt on private videos; it flips them to public at that time
+        body['status']['privacyStatus'] = 'private'
+        body['status']['publishAt'] = publish_at
+    return body
 
-def upload_video(youtube_service, file_path, title, description, tags, privacy_status='public'):
+def upload_video(youtube_service, file_path, title, description, tags, privacy_status='public', publish_at=None):
     """
     Uploads a video to YouTube.
     
@@ -63,26 +87,19 @@ def upload_video(youtube_service, file_path, title, description, tags, privacy_s
         description (str): The description of the video.
         tags (list): A list of strings for the video's tags.
         privacy_status (str): 'private', 'public', or 'unlisted'.
+        publish_at (str): Optional RFC 3339 time (e.g. '2025-07-01T06:30:00Z') at which YouTube
+            makes the video public. Scheduled videos have to be uploaded as 'private'.
     """
     if not os.path.exists(file_path):
         print(f"❌ ERROR: Video file not found at {file_path}")
         return None
 
-    body = {
-        'snippet': {
-            'title': title,
-            'description': description,
-            'tags': tags,
-            'categoryId': '22'  # '22' is "People & Blogs", suitable for motivation
-        },
-        'status': {
-            'privacyStatus': privacy_status,
-            'selfDeclaredMadeForKids': False  # <--- ADDED: Sets 'Not Made for Kids'
-        }
-    }
+    body = video_body(title, description, tags, privacy_status, publish_at)
+    privacy_status = body['status']['privacyStatus']
 
     try:
-        print(f"⬆️  Uploading video '{title}' as '{privacy_status.upper()}' from file '{file_path}'...")
+        print(f"⬆️  Uploading video '{title}' as '{privacy_status.upper()}' from file '{file_path}'..."
+              + (f" (goes public at {publish_at})" if publish_at else ""))
         media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
         
         request = youtube_service.videos().insert(
@@ -0,0 +1,621 @@
+import os
+import queue
+import shutil
+import random
+import threading
+import numpy as np
+from collections import OrderedDict
+from PIL import Image
+from moviepy.editor import *
+from media_index import lookup_music_window
+from music_segments import AUDIO_BITRATE, FADE_IN_SECONDS, FADE_OUT_SECONDS, get_music_segment
+from template_index import CAPTION_CENTERS, HEADING_REGION, lookup_caption_style
+from text_layout import fit_text
+from file_lock import file_lock
+from encode_profiles import DEFAULT_PROFILE, writer_options
+from compositor import composite_stream, estimate_stream_bytes, rasterize_clip, reserve_render_memory, sprite_layer
+from frame_pipe import RawFrameWriter, piped_background_frames
+from background_source import cached_background_frames
+from render_cache import RENDER_CACHE_ENABLED, content_hash, lookup_render, render_key, store_render
+from render_profiler import RenderProfiler, profiling_enabled, stage_timer
+
+# Everything needed to turn a script into a finished short. Kept free of any API
+# authentication so it can be imported by workers and tools without credentials.
+VIDEO_DURATION = 12
+FRAME_WIDTH, FRAME_HEIGHT = 1080, 1920
+FPS = 24
+
+MUSIC_FOLDER = 'spirit_music'
+TEMPLATE_FOLDER = 'spirit_temp'
+TEMPLATE_STATE_FILE = 'spirit_temp/last_video_index.txt'
+
+FONT_PATH = 'fonts/ARLRDBD.TTF'
+HEADING_TEXT = "Spirituality Teaches"
+
+# Captions are auto-fitted into this box before anything is rasterized
+CAPTION_BOX_WIDTH = 1080 * 0.9
+CAPTION_BOX_HEIGHT = 1920 * 0.3
+CAPTION_MAX_LINES = 6
+CAPTION_FONT_SIZES = (44, 90)
+# Captions never start closer than this below the heading box, however tall they are
+CAPTION_HEADING_GAP = 24
+
+# When each caption is on screen and how it fades. A variant can override any of these.
+DEFAULT_TIMING = {
+    'part1_start': 0, 'part1_duration': 6, 'part1_fade_in': 1, 'part1_fade_out': 0.5,
+    'part2_start': 6, 'part2_duration': 6, 'part2_fade_in': 0.5, 'part2_fade_out': 0,
+}
+# Frames buffered per variant sink before the shared background decode waits for it
+SINK_QUEUE_SIZE = 4
+# Full-size frames the moviepy decode/scale/zoom chain holds while producing one frame
+BACKGROUND_PIPELINE_FRAMES = 6
+# Decode the background with an ffmpeg rawvideo pipe into a ring buffer instead of moviepy.
+# Its ring holds every queued frame plus the one each sink is compositing.
+PIPED_BACKGROUND = os.getenv('PIPED_BACKGROUND', '0') == '1'
+PIPED_RING_FRAMES = SINK_QUEUE_SIZE + 2
+# Serve short templates from decoded frames shared by every render in the process (see
+# background_source.py), looped or played back and forth ('pingpong') by index.
+CACHED_BACKGROUND = os.getenv('CACHED_BACKGROUND', '0') == '1'
+BACKGROUND_LOOP_MODE = os.getenv('BACKGROUND_LOOP_MODE', 'loop')
+# Split rendering (split_render.py): segments of the timeline are rendered in parallel
+# processes and joined without re-encoding. One worker means a plain single-pass render.
+# Segments are 2 seconds by default, so a 12-second video can use up to six processes.
+SPLIT_RENDER_WORKERS = int(os.getenv('SPLIT_RENDER_WORKERS', '1'))
+SPLIT_SEGMENT_SECONDS = float(os.getenv('SPLIT_SEGMENT_SECONDS', '2'))
+
+# Draft renders (local previews): same layout, scaled down, fewer frames, fastest encoder
+DRAFT_SCALE = 0.5
+DRAFT_FPS = 12
+DRAFT_PROFILE = 'draft'
+# Key frames of a contact sheet: start of the fade-in, fully faded in, the caption switch, the end
+CONTACT_SHEET_TIMES = (0, 1, 6, 11)
+
+# Rasterized text sprites, reused by every render (and variant) in this process
+SPRITE_CACHE_SIZE = 64
+_sprite_cache = OrderedDict()
+
+
+def select_media() -> tuple[str, str]:
+    """Picks a random music track and the next background template in sequence."""
+    try:
+        music_folder = MUSIC_FOLDER
+        available_music = [f for f in os.listdir(music_folder) if f.endswith('.mp3')]
+        chosen_music_path = os.path.join(music_folder, random.choice(available_music))
+        print(f"🎵 Using music: {chosen_music_path}")
+
+        background_video_folder = TEMPLATE_FOLDER
+        available_videos = sorted([f for f in os.listdir(background_video_folder) if f.endswith('.mp4')]) # Sorted for consistent order
+
+        if not available_videos:
+            exit(f"❌ ERROR: No background videos found in '{background_video_folder}'.")
+
+        # --- NEW: SEQUENTIAL VIDEO SELECTION LOGIC ---
+        state_file = TEMPLATE_STATE_FILE
+        # Locked from read to write, so parallel renders (render daemon workers) get different templates
+        with file_lock(state_file):
+            last_index = -1
+            if os.path.exists(state_file):
+                with open(state_file, 'r') as f:
+                    try:
+                        last_index = int(f.read())
+                    except ValueError:
+                        last_index = -1 # Start from beginning if file is empty or corrupt
+
+            # Calculate the next index, looping back to 0 if at the end of the list
+            next_index = (last_index + 1) % len(available_videos)
+
+            chosen_video_filename = available_videos[next_index]
+            chosen_video_path = os.path.join(background_video_folder, chosen_video_filename)
+
+            # Save the new index for the next run
+            with open(state_file, 'w') as f:
+                f.write(str(next_index))
+
+        print(f"🔄 Sequentially selected video #{next_index + 1}: {chosen_video_path}")
+        # --- END OF NEW LOGIC ---
+
+    except Exception as e:
+        exit(f"❌ ERROR: Could not find media files. Details: {e}")
+    return chosen_music_path, chosen_video_path
+
+
+def prepare_music(music_path: str, temp_folder: str = '.') -> tuple[str, bool]:
+    """
+    Returns the path of a ready-to-mux AAC file for the track, so the final mux can copy it.
+    If the segment cache can't be used, the window is encoded once into a temp file instead.
+
+    Returns:
+        (audio_path, is_temporary)
+    """
+    try:
+        return get_music_segment(music_path, VIDEO_DURATION), False
+    except Exception as e:
+        print(f"⚠️ Could not prepare a music segment, encoding audio for this render. Error: {e}")
+    # The best-sounding window and its loudness gain are precomputed offline (media_index.py)
+    music_start, music_gain_db = lookup_music_window(music_path, VIDEO_DURATION)
+    music_clip = AudioFileClip(music_path).subclip(music_start, music_start + VIDEO_DURATION)
+    if music_gain_db:
+        music_clip = music_clip.volumex(10 ** (music_gain_db / 20))
+    temp_audio_path = os.path.join(temp_folder, f"music_{os.getpid()}_{threading.get_ident()}.m4a")
+    music_clip.write_audiofile(temp_audio_path, codec='aac', logger=None)
+    return temp_audio_path, True
+
+
+def frame_size_for(scale: float = 1.0) -> tuple[int, int]:
+    """Output (width, height) at a layout scale, rounded down to even numbers for yuv420p."""
+    if scale == 1:
+        return FRAME_WIDTH, FRAME_HEIGHT
+    return int(FRAME_WIDTH * scale) // 2 * 2, int(FRAME_HEIGHT * scale) // 2 * 2
+
+
+def _scaled(value, scale: float):
+    """Scales a pixel quantity of the layout; at full size the value passes through untouched."""
+    return value if scale == 1 else value * scale
+
+
+def load_background(video_path: str, profiler=None, scale: float = 1.0):
+    """
+    Loads a template, loops it to the video length and applies the crop and Ken Burns zoom.
+    With a profiler, the decode, scale and zoom steps are each timed per frame.
+    """
+    frame_width, frame_height = frame_size_for(scale)
+    profiled = profiler.wrap_clip if profiler else (lambda clip, name: clip)
+    background_clip = profiled(VideoFileClip(video_path), 'decode')
+    if background_clip.duration < VIDEO_DURATION:
+        background_clip = background_clip.loop(duration=VIDEO_DURATION)
+    final_background = background_clip.subclip(0, VIDEO_DURATION).resize(height=frame_height).crop(x_center=_scaled(background_clip.w/2, scale), width=frame_width)
+    final_background = profiled(final_background, 'scale')
+
+    # The Ken Burns Effect can be here if you want it applied to all videos,
+    # or you can re-implement the conditional logic if needed.
+    final_background = final_background.resize(lambda t: 1 + 0.02 * t)
+    final_background = final_background.crop(x_center=final_background.w / 2, y_center=final_background.h / 2, width=frame_width, height=frame_height)
+    return profiled(final_background, 'zoom')
+
+
+def text_sprite(text: str, **text_options) -> dict:
+    """
+    Rasterizes text through ImageMagick into a premultiplied sprite, or returns the cached
+    one. The cache key is the text plus every TextClip option (font, size, colour, stroke...).
+    """
+    key = (text, tuple(sorted(text_options.items())))
+    sprite = _sprite_cache.get(key)
+    if sprite is None:
+        sprite = rasterize_clip(TextClip(text, **text_options))
+        _sprite_cache[key] = sprite
+        if len(_sprite_cache) > SPRITE_CACHE_SIZE:
+            _sprite_cache.popitem(last=False)
+    else:
+        _sprite_cache.move_to_end(key)
+    return sprite
+
+
+def create_heading_layers(heading_text: str = HEADING_TEXT, font_path: str = FONT_PATH, scale: float = 1.0) -> list:
+    """Creates the permanent white heading box and its text."""
+    box_width = int(_scaled(1080 * 0.7, scale))
+    box_height = int(_scaled(110, scale))
+    vertical_position_percent = 0.20
+    vertical_pixel_position = int(_scaled(1920, scale) * vertical_position_percent)
+    final_position = ('center', vertical_pixel_position)
+    frame_size = frame_size_for(scale)
+
+    heading_bg = {'premultiplied': np.full((box_height, box_width, 3), 255, dtype=np.float32), 'alpha': None}
+    heading_text_sprite = text_sprite(heading_text, fontsize=round(_scaled(75, scale)), color='black', font=font_path,
+                                      size=(box_width, box_height))
+    return [sprite_layer(heading_bg, final_position, frame_size, 0, VIDEO_DURATION, name='heading box'),
+            sprite_layer(heading_text_sprite, final_position, frame_size, 0, VIDEO_DURATION, name='heading text')]
+
+
+def make_caption_sprite(text: str, color: str, caption_style: dict, font_path: str, scale: float = 1.0) -> dict:
+    """
+    Rasterizes a caption at the font size and line breaks chosen by the layout engine.
+    The layout is always fitted at full size, so a scaled-down draft wraps exactly like the final video.
+    """
+    stroke_width = _scaled(caption_style['stroke_width'], scale)
+    try:
+        layout = fit_text(text, font_path, CAPTION_BOX_WIDTH, CAPTION_BOX_HEIGHT, CAPTION_MAX_LINES,
+                          *CAPTION_FONT_SIZES, stroke_width=caption_style['stroke_width'])
+    except Exception as e:
+        print(f"⚠️ Could not measure the caption font, letting ImageMagick wrap it. Error: {e}")
+        return text_sprite(text, fontsize=round(_scaled(80, scale)), color=color, font=font_path, stroke_color='black',
+                           stroke_width=stroke_width, size=(_scaled(CAPTION_BOX_WIDTH, scale), None), method='caption')
+    if not layout['fits']:
+        print(f"⚠️ Caption is too long to fit even at {layout['font_size']}px: '{text[:40]}...'")
+    return text_sprite('\n'.join(layout['lines']), fontsize=round(_scaled(layout['font_size'], scale)), color=color,
+                       font=font_path, stroke_color='black', stroke_width=stroke_width, method='label', align='center')
+
+
+def create_quote_layers(text: str, caption_style: dict, font_path: str, start: float, duration: float,
+                        fade_in: float, fade_out: float = 0, name: str = 'caption', scale: float = 1.0) -> list:
+    """Creates a fading caption, plus a drop shadow behind it if the template's caption style asks for one."""
+    quote_sprite = make_caption_sprite(text, 'white', caption_style, font_path, scale)
+    quote_height, quote_width = quote_sprite['premultiplied'].shape[:2]
+    # Captions are centered on the region picked for this template by template_index.py, but a
+    # tall one in the 'upper' region would reach up into the heading: it's pushed down below it
+    y_position = int(_scaled(1920, scale) * CAPTION_CENTERS[caption_style['position']] - quote_height / 2)
+    y_position = max(y_position, int(_scaled(1920 * HEADING_REGION[1] + CAPTION_HEADING_GAP, scale)))
+    frame_size = frame_size_for(scale)
+    layers = [sprite_layer(quote_sprite, ('center', y_position), frame_size, start, duration, fade_in, fade_out,
+                           name=name)]
+
+    if caption_style['shadow_opacity'] > 0:
+        shadow_offset = int(_scaled(6, scale))
+        shadow_sprite = make_caption_sprite(text, 'black', caption_style, font_path, scale)
+        shadow_x = int((frame_size[0] - shadow_sprite['premultiplied'].shape[1]) / 2) + shadow_offset
+        layers.insert(0, sprite_layer(shadow_sprite, (shadow_x, y_position + shadow_offset), frame_size,
+                                      start, duration, fade_in, fade_out, opacity=caption_style['shadow_opacity'],
+                                      name=f'{name} shadow'))
+    return layers
+
+
+def create_text_layers(variant: dict, caption_style: dict, font_path: str = FONT_PATH, scale: float = 1.0) -> list:
+    """
+    Builds every overlay layer (heading and both captions) for one variant, in compositing order.
+    `scale` shrinks the whole layout for drafts; positions and sizes scale, line breaks don't change.
+    """
+    timing = {**DEFAULT_TIMING, **variant.get('timing', {})}
+    layers = create_heading_layers(variant.get('heading', HEADING_TEXT), font_path, scale)
+    for part in ('part1', 'part2'):
+        layers += create_quote_layers(variant[part], caption_style, font_path,
+                                      timing[f'{part}_start'], timing[f'{part}_duration'],
+                                      fade_in=timing[f'{part}_fade_in'], fade_out=timing[f'{part}_fade_out'],
+                                      name=part, scale=scale)
+    return layers
+
+
+def _queued_frames(frames: queue.Queue):
+    """Yields (t, background_frame) pairs from a sink's queue until the end marker arrives."""
+    while True:
+        item = frames.get()
+        if item is None:
+            return
+        try:
+            yield item
+        finally:
+            # Runs once the frame is composited and encoded (or abandoned), which is what
+            # a lockstep producer waits for with frames.join()
+            frames.task_done()
+
+
+def _variant_sink(frames: queue.Queue, layers: list, writer: RawFrameWriter, errors: list, profiler=None):
+    """Consumes shared background frames, overlays one variant's layers in place and encodes them."""
+    stage = stage_timer(profiler)
+    queued = _queued_frames(frames)
+    try:
+        # The reused output buffer goes to ffmpeg as-is: no per-frame copy on the way out
+        for _, frame in composite_stream(queued, layers, writer.size, profiler):
+            # Time blocked here is encoder back-pressure: ffmpeg isn't draining the pipe fast enough
+            with stage('encode'):
+                writer.write_frame(frame)
+    except Exception as e:
+        errors.append(e)
+        # The failed frame's task_done() runs when the generator is closed. The stored traceback
+        # would keep it open forever, and a lockstep producer waits for it in frames.join().
+        queued.close()
+        # Keep draining so the shared decode loop never blocks on a dead sink
+        while frames.get() is not None:
+            frames.task_done()
+    finally:
+        try:
+            writer.close()
+        except IOError as e:
+            errors.append(e)
+
+
+def estimate_render_bytes(variant_layers: list, piped_background: bool = False,
+                          frame_size: tuple = (FRAME_WIDTH, FRAME_HEIGHT)) -> int:
+    """Estimates the peak memory of a render: the shared background pipeline plus every variant's stream."""
+    frame_bytes = frame_size[0] * frame_size[1] * 3
+    if piped_background:
+        # The ring buffer (or, for cached backgrounds, frames held in flight), plus the zoom's scaled frame (up to 1.24x per side) and its output
+        background_bytes = (PIPED_RING_FRAMES + 3) * frame_bytes
+    else:
+        # Decoding, scaling and zooming keep a few full-size (and larger) frames alive at once,
+        # and every queued frame is one more shared background frame.
+        background_bytes = (BACKGROUND_PIPELINE_FRAMES + SINK_QUEUE_SIZE + 1) * frame_bytes
+    return background_bytes + sum(estimate_stream_bytes(layers, frame_size) for layers in variant_layers)
+
+
+def generate_video_variants(variants: list[dict], output_filenames: list[str],
+                            music_path: str = None, video_path: str = None, encode_profile: str = DEFAULT_PROFILE,
+                            piped_background: bool = PIPED_BACKGROUND, profiler: RenderProfiler = None,
+                            scale: float = 1.0, fps: float = FPS, fragmented: bool = False,
+                            cached_background: bool = CACHED_BACKGROUND, loop_mode: str = BACKGROUND_LOOP_MODE,
+                            frame_range: tuple = None):
+    """
+    Renders several variants of a script over ONE decoded background.
+
+    The background template is decoded, scaled and zoomed once. Every frame is then fanned
+    out to one overlay-and-encode sink per variant, all running at the same time.
+
+    Args:
+        variants (list): dicts with 'part1', 'part2' and optionally 'heading' and 'timing'
+            (overrides for DEFAULT_TIMING, e.g. {'part1_fade_in': 0.5}).
+        output_filenames (list): one output .mp4 path per variant.
+        music_path, video_path: media to use; picked by select_media() if not given.
+        encode_profile (str): a named profile from encode_profiles.ENCODE_PROFILES.
+        piped_background (bool): decode the template through frame_pipe's ffmpeg pipe
+            instead of moviepy.
+        profiler (RenderProfiler): optional; times every per-frame stage of the render.
+        scale, fps: output size relative to 1080x1920 and frame rate; lowered for drafts.
+        fragmented (bool): write fragmented MP4s that can be uploaded while they're encoded.
+        cached_background (bool): serve the template from background_source's per-process
+            cache of decoded frames, looping it by `loop_mode` ('loop' or 'pingpong').
+        frame_range (tuple): (first, end) output frame indices. Only those frames are rendered,
+            without audio: split_render encodes segments this way and muxes the music once.
+    """
+    if len(variants) != len(output_filenames):
+        raise ValueError("Every variant needs exactly one output filename.")
+    print(f"🎬 Generating {len(variants)} video(s) with music: {', '.join(output_filenames)}")
+
+    # --- 1. Select Media ---
+    if not music_path or not video_path:
+        music_path, video_path = select_media()
+
+    # --- 2. Load and Prepare Clips ---
+    # The music is a pre-encoded, trimmed and normalized AAC segment that gets copied
+    # into every output as-is, so no variant decodes or encodes audio.
+    audio_path, audio_is_temporary = prepare_music(music_path) if frame_range is None else (None, False)
+    frame_size = frame_size_for(scale)
+    first_frame, end_frame = frame_range or (0, None)
+    if cached_background:
+        background = None
+        background_frames = cached_background_frames(video_path, frame_size, fps, VIDEO_DURATION, loop_mode,
+                                                     profiler=profiler, scale=scale,
+                                                     first_frame=first_frame, end_frame=end_frame)
+    elif piped_background:
+        background = None
+        background_frames = piped_background_frames(video_path, frame_size, fps, VIDEO_DURATION,
+                                                    ring_size=PIPED_RING_FRAMES, profiler=profiler, scale=scale,
+                                                    first_frame=first_frame, end_frame=end_frame)
+    else:
+        background = load_background(video_path, profiler, scale)
+        if frame_range:
+            background_frames = ((i / fps, background.get_frame(i / fps).astype('uint8'))
+                                 for i in range(first_frame, end_frame))
+        else:
+            background_frames = ((i / fps, frame) for i, frame in enumerate(background.iter_frames(fps=fps, dtype='uint8')))
+    if profiler:
+        background_frames = profiler.wrap_frames('background', background_frames)
+    stage = stage_timer(profiler)
+    # While tracing allocations, only one stage may run at a time for them to be attributable
+    lockstep = bool(profiler and profiler.lockstep)
+
+    # --- 3. Create the overlay layers of each variant ---
+    print(" Adding heading and captions...")
+    # Caption position and stroke/shadow strength come from the precomputed template index
+    caption_style = lookup_caption_style(video_path)
+    print(f" Caption style for this template: {caption_style}")
+    variant_layers = [create_text_layers(variant, caption_style, scale=scale) for variant in variants]
+
+    # --- 4. Decode the background once and fan it out to every variant ---
+    print(f" Compositing final video(s) with the '{encode_profile}' encode profile...")
+    encoder_options = writer_options(encode_profile, VIDEO_DURATION, fragmented)
+    # Wait for room under the memory ceiling shared with other renders on this runner
+    with reserve_render_memory(estimate_render_bytes(variant_layers, piped_background or cached_background,
+                                                    frame_size)):
+        errors, sinks, writers = [], [], []
+        for i, (layers, output_filename) in enumerate(zip(variant_layers, output_filenames)):
+            writer = RawFrameWriter(output_filename, frame_size, fps, audiofile=audio_path, **encoder_options)
+            writers.append(writer)
+            frames = queue.Queue(maxsize=SINK_QUEUE_SIZE)
+            thread = threading.Thread(target=_variant_sink, args=(frames, layers, writer, errors, profiler),
+                                      name=f"variant-{i + 1}", daemon=True)
+            thread.start()
+            sinks.append((frames, thread))
+
+        try:
+            for t, background_frame in background_frames:
+                # Time blocked here means the sinks (compositing + encoding) are the bottleneck
+                with stage('fan-out wait'):
+                    for frames, _ in sinks:
+                        frames.put((t, background_frame))
+                        if lockstep:
+                            frames.join()
+        finally:
+            for frames, thread in sinks:
+                frames.put(None)
+            for _, thread in sinks:
+                thread.join()
+            background_frames.close()
+            if background is not None:
+                background.close()
+            if audio_is_temporary:
+                os.remove(audio_path)
+
+    if errors:
+        raise errors[0]
+    # Compositing copies each background frame into the output buffer once; anything more on the way
+    # from the compositor to ffmpeg is a regression. Copies made while producing the background
+    # frame (decoding, the ring buffer, the zoom's resize) happen before this and aren't counted.
+    frames_written = sum(writer.frames_written for writer in writers)
+    encoder_copies = sum(writer.copies for writer in writers)
+    print(f" Compositor-to-encoder copies per frame: {1 + encoder_copies / max(frames_written, 1):.2f} "
+          f"({frames_written} frames, {encoder_copies} extra copies on the way to ffmpeg; "
+          f"background decode and zoom not counted)")
+    for output_filename in output_filenames:
+        print(f"✅ Video saved successfully as {output_filename}")
+
+
+def render_contact_sheet(variant: dict, output_filename: str, music_path: str = None, video_path: str = None,
+                         scale: float = DRAFT_SCALE, times: tuple = CONTACT_SHEET_TIMES) -> str:
+    """
+    Renders only the key frames of a variant, side by side in one PNG, through the same
+    background, layout and compositing code as a real render. No audio, no encoding.
+    """
+    if not music_path or not video_path:
+        music_path, video_path = select_media()
+    frame_size = frame_size_for(scale)
+    layers = create_text_layers(variant, lookup_caption_style(video_path), scale=scale)
+    background = load_background(video_path, scale=scale)
+    try:
+        timed_frames = ((t, background.get_frame(t).astype(np.uint8)) for t in times)
+        # composite_stream reuses its output buffer, so each frame is copied into the sheet right away
+        sheet = np.zeros((frame_size[1], frame_size[0] * len(times), 3), dtype=np.uint8)
+        for i, (_, frame) in enumerate(composite_stream(timed_frames, layers, frame_size)):
+            sheet[:, i * frame_size[0]:(i + 1) * frame_size[0]] = frame
+    finally:
+        background.close()
+    Image.fromarray(sheet).save(output_filename)
+    print(f"✅ Contact sheet ({', '.join(f'{t}s' for t in times)}) saved as {output_filename}")
+    return output_filename
+
+
+def background_decode(piped_background: bool = PIPED_BACKGROUND, cached_background: bool = CACHED_BACKGROUND) -> dict:
+    """Which path decodes and scales the background. They differ slightly in pixels, so it's part of the cache key."""
+    if cached_background or piped_background:
+        # frame_pipe.background_filter scales in ffmpeg; ken_burns_frame zooms with PIL
+        return {'decoder': 'cache' if cached_background else 'pipe', 'scale': 'ffmpeg lanczos', 'zoom': 'PIL lanczos',
+                'loop_mode': BACKGROUND_LOOP_MODE if cached_background else 'loop'}
+    # moviepy resizes with whichever of OpenCV, PIL or SciPy it found installed
+    from moviepy.video.fx.resize import resizer
+    moviepy_scaler = f"moviepy {getattr(resizer, 'origin', 'unknown')}"
+    return {'decoder': 'moviepy', 'scale': moviepy_scaler, 'zoom': moviepy_scaler, 'loop_mode': 'loop'}
+
+
+def render_inputs(variant: dict, music_path: str, video_path: str, encode_profile: str = DEFAULT_PROFILE,
+                  fragmented: bool = False, segment_seconds: float = None) -> dict:
+    """Everything that determines the pixels and bytes of a render, for its render cache key."""
+    music_start, music_gain_db = lookup_music_window(music_path, VIDEO_DURATION)
+    return {
+        'part1': variant['part1'], 'part2': variant['part2'],
+        'heading': variant.get('heading', HEADING_TEXT),
+        'timing': {**DEFAULT_TIMING, **variant.get('timing', {})},
+        'template': content_hash(video_path),
+        'caption_style': lookup_caption_style(video_path),
+        'background': background_decode(),
+        'music': {'track': content_hash(music_path), 'start': music_start, 'gain_db': music_gain_db,
+                  'fades': (FADE_IN_SECONDS, FADE_OUT_SECONDS), 'bitrate': AUDIO_BITRATE},
+        'font': content_hash(FONT_PATH),
+        'layout': {'frame': (FRAME_WIDTH, FRAME_HEIGHT), 'fps': FPS, 'duration': VIDEO_DURATION,
+                   'caption_box': (CAPTION_BOX_WIDTH, CAPTION_BOX_HEIGHT), 'max_lines': CAPTION_MAX_LINES,
+                   'caption_heading_gap': CAPTION_HEADING_GAP,
+                   'font_sizes': CAPTION_FONT_SIZES},
+        'encoder': writer_options(encode_profile, VIDEO_DURATION, fragmented),
+        # Segments are separate encodes: same pixels, but a different GOP structure and bytes
+        'split_segment_seconds': segment_seconds,
+    }
+
+
+def generate_video_with_music(part1: str, part2: str, output_filename: str, encode_profile: str = DEFAULT_PROFILE,
+                              profile: bool = None, draft: str = None, fragmented: bool = False,
+                              music_path: str = None, video_path: str = None, use_cache: bool = RENDER_CACHE_ENABLED,
+                              split_workers: int = SPLIT_RENDER_WORKERS) -> str:
+    """
+    Generates a video with a sequentially chosen background, music, subtitles, and a heading.
+    With profile=True (or RENDER_PROFILE=1) it also prints a per-stage timing table and saves
+    flame graph stacks next to the video.
+
+    Args:
+        draft (str): None for the real thing, 'video' for a half-size, 12 fps, ultrafast preview,
+            or 'sheet' for a PNG contact sheet of the key frames (saved next to output_filename).
+        fragmented (bool): write a fragmented MP4 that streaming_upload can follow while it grows.
+        music_path, video_path: media to use; picked by select_media() if not given.
+        use_cache (bool): return a copy of an identical earlier render from render_cache if
+            there is one, and store this render there otherwise (if it passes output_validator).
+            Profiled renders always render.
+        split_workers (int): above 1, render SPLIT_SEGMENT_SECONDS segments on that many processes
+            and join them (see split_render.py). Profiled and fragmented renders run in one pass.
+
+    Returns:
+        str: the path of what was written.
+    """
+    variant = {'part1': part1, 'part2': part2}
+    if draft == 'sheet':
+        return render_contact_sheet(variant, os.path.splitext(output_filename)[0] + '.png', music_path, video_path)
+    if draft == 'video':
+        generate_video_variants([variant], [output_filename], music_path, video_path, encode_profile=DRAFT_PROFILE,
+                                scale=DRAFT_SCALE, fps=DRAFT_FPS)
+        return output_filename
+    if draft:
+        raise ValueError(f"Unknown draft mode '{draft}', use 'video' or 'sheet'.")
+
+    profiler = RenderProfiler() if (profiling_enabled() if profile is None else profile) else None
+    # The media are picked up front: they are part of the cache key
+    if not music_path or not video_path:
+        music_path, video_path = select_media()
+    split = split_workers > 1 and not profiler and not fragmented
+    cache_key = None
+    if use_cache and not profiler:
+        try:
+            cache_key = render_key(render_inputs(variant, music_path, video_path, encode_profile, fragmented,
+                                                 SPLIT_SEGMENT_SECONDS if split else None))
+            cached_path = lookup_render(cache_key)
+            if cached_path:
+                shutil.copyfile(cached_path, output_filename)
+                print(f"♻️ Identical render found in the render cache, copied it to {output_filename}")
+                return output_filename
+        except OSError as e:
+            print(f"⚠️ Render cache unavailable, rendering from scratch. Error: {e}")
+            cache_key = None
+
+    if split:
+        from split_render import split_render  # It imports this module to run the segments
+        split_render(variant, output_filename, music_path, video_path, encode_profile, split_workers)
+    else:
+        if profiler:
+            profiler.start()
+        try:
+            generate_video_variants([variant], [output_filename], music_path, video_path,
+                                    encode_profile=encode_profile, profiler=profiler, fragmented=fragmented)
+        finally:
+            if profiler:
+                profiler.stop()
+                print(profiler.report())
+                folded_path = os.path.splitext(output_filename)[0] + '.folded'
+                profiler.write_folded(folded_path)
+                print(f"📊 Flame graph stacks saved to {folded_path}")
+    if cache_key:
+        from output_validator import validate_video  # It imports this module for the frame layout
+        if validate_video(output_filename):
+            print("⚠️ Not storing a render that failed validation in the render cache.")
+            return output_filename
+        try:
+            store_render(cache_key, output_filename)
+        except OSError as e:
+            print(f"⚠️ Could not store the render in the render cache. Error: {e}")
+    return output_filename
+
+
+# Run this file directly to check that a sink failing mid-render can't hang a profiled render,
+# whose producer waits for every frame to be encoded (lockstep) before handing out the next.
+if __name__ == '__main__':
+    class FailingWriter:
+        size = (64, 64)
+
+        def __init__(self):
+            self.frames_written = 0
+
+        def write_frame(self, frame):
+            if self.frames_written == 2:
+                raise IOError("encoder died")
+            self.frames_written += 1
+
+        def close(self):
+            pass
+
+    profiler = RenderProfiler()
+    assert profiler.lockstep
+    profiler.start()
+    frames, errors = queue.Queue(maxsize=SINK_QUEUE_SIZE), []
+    sink = threading.Thread(target=_variant_sink, args=(frames, [], FailingWriter(), errors, profiler), daemon=True)
+    sink.start()
+
+    def produce():
+        for i in range(10):
+            frames.put((i / FPS, np.zeros((64, 64, 3), dtype=np.uint8)))
+            frames.join()
+        frames.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    producer.join(timeout=10)
+    sink.join(timeout=10)
+    profiler.stop()
+    if producer.is_alive() or sink.is_alive():
+        print("❌ The producer is still waiting for a frame the failed sink never finished.")
+        raise SystemExit(1)
+    if [str(e) for e in errors] != ["encoder died"]:
+        print(f"❌ Expected the sink's one error, got {errors}")
+        raise SystemExit(1)
+    print("✅ A failing sink released its frame; the profiled render ran to the end and kept the error.")